@@ -0,0 +1,87 @@
+import torch
+
+
+# Whole-batch augmentation on padded (B, T) waveforms. Every op draws its
+# parameters per row and runs as a few tensor ops over the batch instead of
+# per-clip Python calls.
+class BatchAugment:
+    def __init__(
+        self,
+        noise_p=0.25,
+        noise_amplitude=(0.001, 0.010),
+        gain_p=0.5,
+        gain_db=(-6.0, 6.0),
+        speed_p=0.5,
+        speed_range=(0.85, 1.15),
+        generator=None,
+    ):
+        self.noise_p = noise_p
+        self.noise_amplitude = noise_amplitude
+        self.gain_p = gain_p
+        self.gain_db = gain_db
+        self.speed_p = speed_p
+        self.speed_range = speed_range
+        self.generator = generator
+
+    def _uniform(self, n, low, high):
+        return torch.rand(n, generator=self.generator) * (high - low) + low
+
+    def _chosen(self, n, p):
+        return torch.rand(n, generator=self.generator) < p
+
+    def speed(self, values, lengths):
+        # Resampling by a per-row factor changes tempo and pitch together
+        # (Kaldi-style speed perturbation), standing in for separate
+        # TimeStretch/PitchShift. Linear interpolation is vectorized over the
+        # batch; its mild aliasing is harmless at these factors.
+        n = values.shape[0]
+        low, high = self.speed_range
+        rates = torch.where(
+            self._chosen(n, self.speed_p), self._uniform(n, low, high), 1.0
+        )
+
+        new_lengths = torch.floor(lengths / rates).long().clamp(min=1)
+        out_len = int(new_lengths.max())
+
+        pos = torch.arange(out_len, dtype=torch.float32)[None, :] * rates[:, None]
+        last = (lengths - 1).clamp(min=0)[:, None]
+        left = pos.floor().long().clamp(max=values.shape[1] - 1)
+        left = torch.minimum(left, last)
+        right = torch.minimum(left + 1, last)
+        frac = (pos - left).clamp(0, 1)
+
+        out = torch.lerp(values.gather(1, left), values.gather(1, right), frac)
+        out *= torch.arange(out_len)[None, :] < new_lengths[:, None]
+        return out, new_lengths
+
+    def gain(self, values):
+        n = values.shape[0]
+        db = self._uniform(n, *self.gain_db) * self._chosen(n, self.gain_p)
+        return values * torch.pow(10.0, db / 20)[:, None]
+
+    def noise(self, values, lengths):
+        n, t = values.shape
+        amplitude = self._uniform(n, *self.noise_amplitude)
+        amplitude *= self._chosen(n, self.noise_p)
+        mask = torch.arange(t)[None, :] < lengths[:, None]
+        noise = torch.randn(values.shape, generator=self.generator)
+        return values + noise * (amplitude[:, None] * mask)
+
+    def __call__(self, values, lengths):
+        values, lengths = self.speed(values, lengths)
+        values = self.gain(values)
+        values = self.noise(values, lengths)
+        return values, lengths
+
+
+def normalize(values, lengths, eps=1e-7):
+    # Zero mean, unit variance over each row's valid samples, padding zeroed;
+    # the same output as Wav2Vec2FeatureExtractor with an attention mask.
+    mask = torch.arange(values.shape[1])[None, :] < lengths[:, None]
+    n = lengths[:, None].clamp(min=1).to(values.dtype)
+
+    values = values * mask
+    mean = values.sum(dim=1, keepdim=True) / n
+    centered = (values - mean) * mask
+    var = (centered * centered).sum(dim=1, keepdim=True) / n
+    return centered / torch.sqrt(var + eps), mask.long()
@@ -0,0 +1,147 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+from train import N_PROC, load_splits, preprocess
+
+
+def export_test_set(path, limit=None):
+    dataset, _ = load_splits()
+    test = dataset["test"]
+    if limit:
+        test = test.select(range(min(limit, len(test))))
+
+    test = test.map(
+        preprocess,
+        num_proc=N_PROC,
+        remove_columns=["clip"],
+    )
+
+    values = [np.asarray(v, dtype=np.float32) for v in test["input_values"]]
+    np.savez(
+        path,
+        values=np.concatenate(values),
+        lengths=np.array([len(v) for v in values]),
+        labels=np.array(test["label"]),
+    )
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def evaluate_model(model_path, test_path, threads):
+    # Runs in a fresh process so RSS reflects only this model.
+    import onnxruntime as ort
+
+    data = np.load(test_path)
+    offsets = np.concatenate([[0], np.cumsum(data["lengths"])])
+    rss_before = peak_rss_mb()
+
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+
+    start = time.perf_counter()
+    session = ort.InferenceSession(
+        model_path, options, providers=["CPUExecutionProvider"]
+    )
+    load_s = time.perf_counter() - start
+    input_names = {i.name for i in session.get_inputs()}
+
+    preds = []
+    latencies = []
+    for i in range(len(data["lengths"])):
+        values = data["values"][offsets[i] : offsets[i + 1]][None]
+        feeds = {"input_values": values}
+        if "attention_mask" in input_names:
+            feeds["attention_mask"] = np.ones(values.shape, dtype=np.int64)
+
+        start = time.perf_counter()
+        logits = session.run(None, feeds)[0][0]
+        latencies.append(time.perf_counter() - start)
+        preds.append(int(np.argmax(logits)))
+
+    labels = data["labels"]
+    _, _, f1, _ = precision_recall_fscore_support(labels, preds, average="weighted")
+    latencies_ms = np.array(latencies) * 1000
+
+    return {
+        "model": model_path,
+        "size_mb": os.path.getsize(model_path) / 2**20,
+        "accuracy": accuracy_score(labels, preds),
+        "f1": f1,
+        "load_s": load_s,
+        "latency_ms_p50": float(np.percentile(latencies_ms, 50)),
+        "latency_ms_p95": float(np.percentile(latencies_ms, 95)),
+        "latency_ms_mean": float(latencies_ms.mean()),
+        "rss_mb": peak_rss_mb() - rss_before,
+        "samples": len(preds),
+    }
+
+
+def compare(models, limit=None, threads=None):
+    ctx = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        test_path = os.path.join(tmp, "test.npz")
+        export_test_set(test_path, limit=limit)
+
+        report = {}
+        for name, path in models.items():
+            with ctx.Pool(1) as pool:
+                report[name] = pool.apply(evaluate_model, (path, test_path, threads))
+
+    return report
+
+
+def format_report(report, baseline=None):
+    baseline = report.get(baseline) if baseline else None
+
+    lines = [
+        "| model | size MB | accuracy | F1 | p50 ms | p95 ms | RSS MB |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for name, r in report.items():
+        speedup = ""
+        if baseline and r is not baseline:
+            speedup = f" ({baseline['latency_ms_p50'] / r['latency_ms_p50']:.2f}x)"
+        lines.append(
+            f"| {name} | {r['size_mb']:.1f} | {r['accuracy']:.4f} | {r['f1']:.4f} "
+            f"| {r['latency_ms_p50']:.1f}{speedup} | {r['latency_ms_p95']:.1f} "
+            f"| {r['rss_mb']:.0f} |"
+        )
+
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        required=True,
+        help="name=path pairs; the first one is the baseline",
+    )
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--report", default="compare_report.json")
+    args = parser.parse_args()
+
+    models = dict(m.split("=", 1) for m in args.models)
+    report = compare(models, limit=args.limit, threads=args.threads)
+
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(format_report(report, baseline=next(iter(models))))
+
+
+if __name__ == "__main__":
+    main()
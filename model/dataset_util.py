@@ -1,10 +1,11 @@
 import glob
 import os
 import shutil
+import urllib.error
 import urllib.request
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from datasets import Audio, Dataset
 from tqdm import tqdm
 
 RAVDESS_EMOTIONS = {
@@ -49,42 +50,67 @@ EMODB_EMOTIONS = {
 }
 
 
-def download_ravdess(base_dir="data"):
+COMPLETE_MARKER = ".complete"
+
+
+def download_ravdess(base_dir="data", position=0):
     return download_and_extract(
         url="https://zenodo.org/record/1188976/files/Audio_Speech_Actors_01-24.zip",
         archive_path=os.path.join(base_dir, "ravdess.zip"),
         extract_dir=os.path.join(base_dir, "ravdess"),
         dataset_name="RAVDESS",
+        position=position,
     )
 
 
-def download_tess(base_dir="data"):
+def download_tess(base_dir="data", position=0):
     return download_and_extract(
         url="https://www.kaggle.com/api/v1/datasets/download/ejlok1/toronto-emotional-speech-set-tess",
         archive_path=os.path.join(base_dir, "tess.zip"),
         extract_dir=os.path.join(base_dir, "tess"),
         dataset_name="TESS",
+        position=position,
     )
 
 
-def download_cremad(base_dir="data"):
+def download_cremad(base_dir="data", position=0):
     return download_and_extract(
         url="https://www.kaggle.com/api/v1/datasets/download/ejlok1/cremad",
         archive_path=os.path.join(base_dir, "crema-d.zip"),
         extract_dir=os.path.join(base_dir, "CREMA-D"),
         dataset_name="CREMA-D",
+        position=position,
     )
 
 
-def download_emodb(base_dir="data"):
+def download_emodb(base_dir="data", position=0):
     return download_and_extract(
         url="https://www.kaggle.com/api/v1/datasets/download/piyushagni5/berlin-database-of-emotional-speech-emodb",
         archive_path=os.path.join(base_dir, "emodb.zip"),
         extract_dir=os.path.join(base_dir, "emodb"),
         dataset_name="EMODB",
+        position=position,
     )
 
 
+DOWNLOADERS = {
+    "ravdess": download_ravdess,
+    "tess": download_tess,
+    "cremad": download_cremad,
+    "emodb": download_emodb,
+}
+
+
+def download_all(base_dir="data", names=None, max_workers=4):
+    names = list(names or DOWNLOADERS)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            name: pool.submit(DOWNLOADERS[name], base_dir, position=i)
+            for i, name in enumerate(names)
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
 def cleanup(paths):
     for path in paths:
         try:
@@ -96,55 +122,131 @@ def cleanup(paths):
             print(f"Cleanup failed for {path}: {e}")
 
 
-def download_and_extract(url, archive_path, extract_dir, dataset_name="dataset"):
-    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
-    os.makedirs(extract_dir, exist_ok=True)
+def download_file(url, path, desc="Downloading", position=0, retries=3):
+    # Streams into `path`.part and resumes it with a Range request, so an
+    # interrupted download only fetches the missing bytes.
+    part_path = path + ".part"
+
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+        request = urllib.request.Request(url)
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+
+        try:
+            with urllib.request.urlopen(request) as response:
+                if offset and response.status != 206:
+                    # The server ignored the range; start over.
+                    offset = 0
+
+                length = response.headers.get("Content-Length")
+                total = offset + int(length) if length else None
+
+                with open(part_path, "ab" if offset else "wb") as f, tqdm(
+                    total=total,
+                    initial=offset,
+                    unit="B",
+                    unit_scale=True,
+                    desc=desc,
+                    position=position,
+                    leave=False,
+                ) as t:
+                    for block in iter(lambda: response.read(1 << 20), b""):
+                        f.write(block)
+                        t.update(len(block))
+
+                if total is not None and os.path.getsize(part_path) < total:
+                    raise IOError(f"Connection closed early downloading {url}")
+            break
+
+        except urllib.error.HTTPError as e:
+            # The part file already holds the whole archive.
+            if e.code == 416 and offset:
+                break
+            if attempt == retries or e.code < 500:
+                raise
+        except (urllib.error.URLError, IOError):
+            if attempt == retries:
+                raise
+
+        print(f"{desc}: retrying ({attempt + 1}/{retries})")
+
+    os.replace(part_path, path)
+
+
+def _extract_members(archive_path, members, extract_dir):
+    # Each thread needs its own handle; zlib and file writes release the GIL.
+    with zipfile.ZipFile(archive_path, "r") as archive:
+        for member in members:
+            archive.extract(member, extract_dir)
+    return len(members)
+
+
+def extract_archive(archive_path, extract_dir, desc="Extracting", max_workers=8):
+    with zipfile.ZipFile(archive_path, "r") as archive:
+        members = archive.infolist()
+
+    # Create directories up front so workers never race on makedirs; parts
+    # are sanitized the way ZipFile.extract does.
+    for member in members:
+        parts = member.filename.split("/")[:-1]
+        parts = [p for p in parts if p not in ("", ".", "..")]
+        os.makedirs(os.path.join(extract_dir, *parts), exist_ok=True)
 
-    if os.path.isdir(extract_dir) and not len(os.listdir(extract_dir)) == 0:
-        print(f"{dataset_name} directory already exists. Skipping download.")
+    files = [m for m in members if not m.is_dir()]
+    groups = [files[i::max_workers] for i in range(max_workers)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool, tqdm(
+        total=len(files), desc=desc
+    ) as t:
+        futures = [
+            pool.submit(_extract_members, archive_path, group, extract_dir)
+            for group in groups
+            if group
+        ]
+        for future in as_completed(futures):
+            t.update(future.result())
+
+
+def download_and_extract(
+    url, archive_path, extract_dir, dataset_name="dataset", position=0
+):
+    # A corpus counts as present only once its marker exists, so a
+    # half-extracted directory is redone instead of trusted.
+    marker = os.path.join(extract_dir, COMPLETE_MARKER)
+    if os.path.isfile(marker):
+        print(f"{dataset_name} already downloaded. Skipping download.")
         return extract_dir
 
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+
     try:
-        print(f"{dataset_name} not found. Downloading...")
-
-        # Download with progress bar
-        with tqdm(
-            unit="B", unit_scale=True, miniters=1, desc=f"Downloading {dataset_name}"
-        ) as t:
-            last = 0
-
-            def reporthook(count, block_size, total_size):
-                nonlocal last
-                if t.total is None:
-                    t.total = total_size
-                downloaded = count * block_size
-                delta = downloaded - last
-                last = downloaded
-                if delta > 0:
-                    t.update(delta)
-
-            urllib.request.urlretrieve(url, archive_path, reporthook)
-
-        # Extract
-        with zipfile.ZipFile(archive_path, "r") as archive:
-            members = archive.namelist()
-            for member in tqdm(members, desc=f"Extracting {dataset_name}"):
-                archive.extract(member, extract_dir)
-
-        print(f"{dataset_name} downloaded and extracted successfully.")
-        return extract_dir
+        if not os.path.isfile(archive_path):
+            print(f"{dataset_name} not found. Downloading...")
+            download_file(
+                url, archive_path, f"Downloading {dataset_name}", position=position
+            )
+
+        cleanup([extract_dir])
+        os.makedirs(extract_dir, exist_ok=True)
+        extract_archive(archive_path, extract_dir, f"Extracting {dataset_name}")
+
+        with open(marker, "w"):
+            pass
 
     except Exception as e:
+        # Keep the archive or its .part file so the next run resumes.
         print(f"Error downloading or extracting {dataset_name}: {e}")
         cleanup([extract_dir])
         return None
 
-    finally:
-        if os.path.isfile(archive_path):
-            try:
-                os.remove(archive_path)
-            except Exception as e:
-                print(f"Failed to remove archive {archive_path}: {e}")
+    try:
+        os.remove(archive_path)
+    except Exception as e:
+        print(f"Failed to remove archive {archive_path}: {e}")
+
+    print(f"{dataset_name} downloaded and extracted successfully.")
+    return extract_dir
 
 
 def load_ravdess_dataset(root):
@@ -193,33 +295,29 @@ def load_emodb_dataset(root):
     return samples
 
 
-def load_all_datasets(
-    ravdess_dir=None,
-    tess_dir=None,
-    cremad_dir=None,
-    emodb_dir=None,
-):
-    samples = []
+CORPUS_LOADERS = {
+    "ravdess": load_ravdess_dataset,
+    "tess": load_tess_dataset,
+    "cremad": load_crema_dataset,
+    "emodb": load_emodb_dataset,
+}
+
 
-    if ravdess_dir:
-        samples += load_ravdess_dataset(ravdess_dir)
-    if tess_dir:
-        samples += load_tess_dataset(tess_dir)
-    if cremad_dir:
-        samples += load_crema_dataset(cremad_dir)
-    if emodb_dir:
-        samples += load_emodb_dataset(emodb_dir)
+def index_datasets(dirs, max_workers=4):
+    # Globbing is I/O bound, so the corpora are scanned concurrently; samples
+    # keep the fixed corpus order so splits stay reproducible.
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        scans = [
+            (name, pool.submit(CORPUS_LOADERS[name], root))
+            for name, root in dirs.items()
+            if root
+        ]
+        samples = []
+        for name, scan in scans:
+            samples += [{**s, "corpus": name} for s in scan.result()]
 
     # Create unified label mapping
     unique_emotions = sorted({s["emotion"] for s in samples})
     emotion2id = {e: i for i, e in enumerate(unique_emotions)}
 
-    dataset_dict = {
-        "audio": [s["audio"] for s in samples],
-        "label": [emotion2id[s["emotion"]] for s in samples],
-    }
-
-    dataset = Dataset.from_dict(dataset_dict)
-    dataset = dataset.cast_column("audio", Audio(sampling_rate=16000))
-
-    return dataset, emotion2id
+    return samples, emotion2id
@@ -0,0 +1,195 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import torch
+from heads import HEADS, evaluate_head, train_head
+from sampling import LengthBucketSampler
+from tqdm import tqdm
+from train import (
+    BATCH_SIZE,
+    CACHE_DIR,
+    MAX_SAMPLES,
+    cached_split,
+    feature_cache,
+    load_splits,
+)
+from trainer import AudioCollator
+from transformers import AutoModel
+
+EMBEDDINGS_DIR = os.path.join(CACHE_DIR, "embeddings")
+
+
+def model_revision(model):
+    # Hub models carry their commit; for local checkpoints, fingerprint the
+    # files so retraining into the same directory starts a new store.
+    commit = getattr(model.config, "_commit_hash", None)
+    if commit:
+        return commit
+
+    path = model.config._name_or_path
+    h = hashlib.sha256()
+    for name in sorted(os.listdir(path)):
+        stat = os.stat(os.path.join(path, name))
+        h.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return h.hexdigest()[:16]
+
+
+# Pooled hidden states of every layer, one fixed-size float16 row per clip in
+# a single append-only file that is read back as a memory map. The index maps
+# clip keys to rows and is rewritten after the data, so it never points past
+# what has been written.
+class EmbeddingStore:
+    def __init__(self, root, num_layers, hidden_size):
+        self.root = root
+        self.row_shape = (num_layers, hidden_size)
+        self._data_path = os.path.join(root, "embeddings.f16")
+        self._index_path = os.path.join(root, "index.json")
+        self.rows = {}
+
+        os.makedirs(root, exist_ok=True)
+        if os.path.isfile(self._index_path):
+            with open(self._index_path) as f:
+                self.rows = json.load(f)["rows"]
+
+    def append(self, keys, embeddings):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float16)
+        with open(self._data_path, "ab") as f:
+            f.truncate(len(self.rows) * embeddings[0].nbytes)
+            f.write(embeddings.tobytes())
+
+        for key in keys:
+            self.rows[key] = len(self.rows)
+
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"shape": self.row_shape, "rows": self.rows}, f)
+        os.replace(tmp_path, self._index_path)
+
+    def get(self, keys):
+        data = np.memmap(
+            self._data_path,
+            dtype=np.float16,
+            mode="r",
+            shape=(len(self.rows), *self.row_shape),
+        )
+        return data[[self.rows[k] for k in keys]].astype(np.float32)
+
+
+def clip_keys(dataset):
+    # Cache entries are named by the clip's preprocessing key.
+    return [os.path.splitext(os.path.basename(p))[0] for p in dataset.clip_paths]
+
+
+def pooled_hidden_states(model, input_values, attention_mask):
+    outputs = model(
+        input_values, attention_mask=attention_mask, output_hidden_states=True
+    )
+    hidden = torch.stack(outputs.hidden_states, dim=1)
+
+    mask = model._get_feature_vector_attention_mask(hidden.shape[2], attention_mask)
+    mask = mask[:, None, :, None].to(hidden.dtype)
+    return (hidden * mask).sum(dim=2) / mask.sum(dim=2).clamp(min=1)
+
+
+def extract(model, store, dataset, keys, device, batch_size=BATCH_SIZE):
+    # Identical audio files share a key; embed each key once.
+    first = {}
+    for i, k in enumerate(keys):
+        if k not in store.rows:
+            first.setdefault(k, i)
+    todo = list(first.values())
+    if not todo:
+        return
+
+    subset = torch.utils.data.Subset(dataset, todo)
+    sampler = LengthBucketSampler(
+        [dataset.lengths[i] for i in todo], batch_size=batch_size, shuffle=False
+    )
+    collator = AudioCollator(MAX_SAMPLES)
+
+    with torch.inference_mode():
+        for batch in tqdm(sampler, desc="Embedding"):
+            inputs = collator([subset[i] for i in batch])
+            pooled = pooled_hidden_states(
+                model,
+                inputs["input_values"].to(device),
+                inputs["attention_mask"].to(device),
+            )
+            store.append([keys[todo[i]] for i in batch], pooled.float().cpu().numpy())
+
+
+def load_embeddings(backbone, revision=None, device="cpu"):
+    dataset, emotion2id = load_splits()
+    cache = feature_cache()
+
+    model = AutoModel.from_pretrained(backbone, revision=revision).to(device).eval()
+    store = EmbeddingStore(
+        os.path.join(
+            EMBEDDINGS_DIR,
+            f"{os.path.basename(backbone.rstrip('/'))}@{model_revision(model)}",
+        ),
+        model.config.num_hidden_layers + 1,
+        model.config.hidden_size,
+    )
+
+    splits = {}
+    for name in ("train", "validation", "test"):
+        clips = cached_split(dataset[name], cache, desc=name)
+        keys = clip_keys(clips)
+        extract(model, store, clips, keys, device)
+        splits[name] = (store.get(keys), np.asarray(clips.labels))
+
+    return splits, emotion2id
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--backbone", default="microsoft/wavlm-large", help="hub name or local dir"
+    )
+    parser.add_argument("--revision", default=None)
+    parser.add_argument(
+        "--device", default="cuda" if torch.cuda.is_available() else "cpu"
+    )
+    parser.add_argument("--heads", nargs="+", choices=HEADS, default=list(HEADS))
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--weight-decay", type=float, default=1e-2)
+    parser.add_argument("--balanced", action="store_true")
+    parser.add_argument("--out", default=None, help="save the best head here")
+    args = parser.parse_args()
+
+    splits, emotion2id = load_embeddings(args.backbone, args.revision, args.device)
+
+    results = {}
+    for kind in args.heads:
+        head, best = train_head(
+            kind,
+            splits["train"],
+            splits["validation"],
+            len(emotion2id),
+            epochs=args.epochs,
+            lr=args.lr,
+            weight_decay=args.weight_decay,
+            balanced=args.balanced,
+        )
+        test = evaluate_head(head, *(torch.as_tensor(a) for a in splits["test"]))
+        results[kind] = (head, best, test)
+        print(
+            f"{kind}: val accuracy {best['accuracy']:.4f} (epoch {best['epoch']}), "
+            f"test accuracy {test['accuracy']:.4f}, F1 {test['f1']:.4f}"
+        )
+
+    if args.out:
+        kind, (head, _, _) = max(results.items(), key=lambda r: r[1][1]["accuracy"])
+        torch.save(
+            {"kind": kind, "state_dict": head.state_dict(), "labels": emotion2id},
+            args.out,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import shutil
+from collections import Counter
+from urllib.parse import urlparse
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+import torch
+from augment import normalize
+from feature_cache import file_digest
+from onnxruntime.transformers.fusion_options import FusionOptions
+from onnxruntime.transformers.optimizer import optimize_model
+from train import MAX_SAMPLES, OUT_DIR, SAMPLE_RATE, SCRIPT_DIR
+from transformers import WavLMForSequenceClassification
+
+MANIFESTS_DIR = os.path.join(SCRIPT_DIR, "..", "manifests")
+OPSET = 17
+
+# Full, padded and short clips in one batch, so parity covers the attention
+# mask as well as the dynamic axes.
+PARITY_LENGTHS = (MAX_SAMPLES, SAMPLE_RATE * 2 + 123, SAMPLE_RATE)
+
+# Ops each fusion produces. At opset 17 torch already exports plain
+# LayerNormalization, so only ops the raw export can't contain show a fusion.
+FUSED_OPS = {
+    "SkipLayerNormalization": (
+        "SkipLayerNormalization",
+        "SkipSimplifiedLayerNormalization",
+    ),
+    "Gelu": ("Gelu", "BiasGelu", "FastGelu"),
+    "Attention": ("Attention", "MultiHeadAttention"),
+}
+
+# Matches the loader's fetchers in services/inference/app/loader.py.
+URL_TYPES = {"gs": "gcs", "http": "http", "https": "https", "": "file", "file": "file"}
+
+
+class Logits(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_values, attention_mask):
+        return self.model(input_values, attention_mask=attention_mask).logits
+
+
+def parity_batch(seed=67):
+    generator = torch.Generator().manual_seed(seed)
+    lengths = torch.tensor(PARITY_LENGTHS)
+    values = torch.zeros(len(lengths), int(lengths.max()))
+    for i, n in enumerate(PARITY_LENGTHS):
+        values[i, :n] = torch.randn(n, generator=generator) * 0.1
+    return normalize(values, lengths)
+
+
+def export(model, path):
+    input_values, attention_mask = parity_batch()
+    with torch.no_grad():
+        torch.onnx.export(
+            Logits(model),
+            (input_values, attention_mask),
+            path,
+            input_names=["input_values", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_values": {0: "batch", 1: "samples"},
+                "attention_mask": {0: "batch", 1: "samples"},
+                "logits": {0: "batch"},
+            },
+            opset_version=OPSET,
+            do_constant_folding=True,
+        )
+
+
+def optimize(raw_path, out_path, config):
+    # opt_level=0 applies only the transformer fusions; ORT's own graph
+    # optimizations depend on the machine and run at session creation anyway.
+    # WavLM's gated relative-position attention doesn't match the BERT
+    # attention pattern, so attention stays unfused and only the residual
+    # Add + LayerNorm and GELU are fused.
+    options = FusionOptions("bert")
+    options.enable_gelu_approximation = False
+
+    optimized = optimize_model(
+        raw_path,
+        model_type="bert",
+        num_heads=config.num_attention_heads,
+        hidden_size=config.hidden_size,
+        optimization_options=options,
+        opt_level=0,
+    )
+    optimized.save_model_to_file(out_path)
+
+    before = op_counts(onnx.load(raw_path, load_external_data=False))
+    return before, op_counts(optimized.model)
+
+
+def op_counts(model):
+    return Counter(node.op_type for node in model.graph.node)
+
+
+def check_fusions(before, after):
+    # Fused ops gained over the raw export, so a fusion that silently stops
+    # matching fails the export.
+    gained = {
+        kind: sum(after[op] - before[op] for op in ops)
+        for kind, ops in FUSED_OPS.items()
+    }
+
+    missing = [kind for kind in ("SkipLayerNormalization", "Gelu") if gained[kind] <= 0]
+    if missing:
+        raise ValueError(f"No {' or '.join(missing)} nodes were fused")
+    if gained["Attention"] <= 0:
+        print("Attention is not fused; quantization will only cover MatMul")
+    return gained
+
+
+def check_parity(model, onnx_path, atol):
+    input_values, attention_mask = parity_batch()
+    with torch.no_grad():
+        expected = Logits(model)(input_values, attention_mask).numpy()
+
+    session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    (actual,) = session.run(
+        ["logits"],
+        {
+            "input_values": input_values.numpy(),
+            "attention_mask": attention_mask.numpy(),
+        },
+    )
+
+    max_diff = float(np.abs(actual - expected).max())
+    same_argmax = bool((actual.argmax(-1) == expected.argmax(-1)).all())
+    if max_diff > atol or not same_argmax:
+        raise ValueError(
+            f"ONNX logits differ from Torch by {max_diff:.2e} "
+            f"(atol {atol:.0e}, same predictions: {same_argmax})"
+        )
+    return max_diff
+
+
+def checkpoint_labels(config):
+    labels = dict(config.label2id)
+    # Checkpoints trained before label names were saved carry LABEL_<i>.
+    if labels == {f"LABEL_{i}": i for i in range(config.num_labels)}:
+        raise ValueError(
+            "Checkpoint has no label names; retrain or pass --labels in id order"
+        )
+    return labels
+
+
+def artifact(path, base_url):
+    url = f"{base_url}/{os.path.basename(path)}"
+    return {
+        "url": url,
+        "sha256": file_digest(path),
+        "type": URL_TYPES[urlparse(url).scheme],
+    }
+
+
+def build_manifest(name, version, model_path, extractor_path, labels, base_url):
+    model = artifact(model_path, base_url)
+    return {
+        "schema_version": "1.0",
+        "model": {
+            "name": name,
+            "version": version,
+            "sha256": model["sha256"],
+            "size_bytes": os.path.getsize(model_path),
+            "format": "onnx",
+        },
+        "audio": {"sample_rate": SAMPLE_RATE, "channels": 1},
+        "labels": dict(sorted(labels.items(), key=lambda kv: kv[1])),
+        "artifacts": {
+            "model": model,
+            "feature_extractor": artifact(extractor_path, base_url),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--checkpoint", default=OUT_DIR)
+    parser.add_argument("--out-dir", default=None, help="defaults to --checkpoint")
+    parser.add_argument("--name", default="tone")
+    parser.add_argument("--version", required=True)
+    parser.add_argument(
+        "--base-url",
+        default="gs://tone-ml",
+        help="artifacts are published under <base-url>/<name>/<version>/",
+    )
+    parser.add_argument("--manifest", default=None)
+    parser.add_argument("--labels", nargs="+", default=None)
+    parser.add_argument("--atol", type=float, default=1e-3)
+    parser.add_argument("--force", action="store_true", help="overwrite a manifest")
+    args = parser.parse_args()
+
+    out_dir = args.out_dir or args.checkpoint
+    manifest_path = args.manifest or os.path.join(
+        MANIFESTS_DIR, f"{args.name}-{args.version}.json"
+    )
+    if os.path.exists(manifest_path) and not args.force:
+        raise FileExistsError(f"{manifest_path} exists; versions are immutable")
+
+    model = WavLMForSequenceClassification.from_pretrained(args.checkpoint).eval()
+    if args.labels:
+        labels = {label: i for i, label in enumerate(args.labels)}
+    else:
+        labels = checkpoint_labels(model.config)
+    if len(labels) != model.config.num_labels:
+        raise ValueError(
+            f"{len(labels)} labels for a model with {model.config.num_labels} outputs"
+        )
+
+    os.makedirs(out_dir, exist_ok=True)
+    model_path = os.path.join(out_dir, "model.onnx")
+    raw_path = model_path + ".raw"
+    try:
+        export(model, raw_path)
+        before, after = optimize(raw_path, model_path, model.config)
+    finally:
+        if os.path.isfile(raw_path):
+            os.remove(raw_path)
+
+    fused = check_fusions(before, after)
+    print(
+        f"Fused operators: {json.dumps(fused)}; nodes "
+        f"{sum(before.values())} -> {sum(after.values())}"
+    )
+    max_diff = check_parity(model, model_path, args.atol)
+    print(f"Max logit difference vs Torch: {max_diff:.2e}")
+
+    extractor_path = os.path.join(out_dir, "preprocessor_config.json")
+    source = os.path.join(args.checkpoint, "preprocessor_config.json")
+    if os.path.abspath(source) != os.path.abspath(extractor_path):
+        shutil.copyfile(source, extractor_path)
+
+    manifest = build_manifest(
+        args.name,
+        args.version,
+        model_path,
+        extractor_path,
+        labels,
+        f"{args.base_url.rstrip('/')}/{args.name}/{args.version}",
+    )
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    print(f"Wrote {model_path} and {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+from multiprocessing import Pool
+
+import numpy as np
+from tqdm import tqdm
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# Preprocessed clips on disk, one .npy per (source file, params) pair. Keys
+# combine the source's content hash with the preprocessing parameters, so
+# changing a parameter only misses the entries built with the old value.
+class FeatureCache:
+
+    def __init__(self, root, params):
+        self.root = root
+        self.params = params
+        self._params_json = json.dumps(params, sort_keys=True)
+        self._index_path = os.path.join(root, "digests.json")
+        self._digests = {}
+
+        os.makedirs(root, exist_ok=True)
+        if os.path.isfile(self._index_path):
+            with open(self._index_path) as f:
+                self._digests = json.load(f)
+
+    def _source_digest(self, path):
+        # Rehashing every corpus file each run is slow; reuse the digest
+        # while the file's size and mtime are unchanged.
+        stat = os.stat(path)
+        stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+        entry = self._digests.get(path)
+        if entry is None or entry["stamp"] != stamp:
+            entry = {"stamp": stamp, "sha256": file_digest(path)}
+            self._digests[path] = entry
+        return entry["sha256"]
+
+    def key(self, path):
+        h = hashlib.sha256(self._source_digest(path).encode())
+        h.update(self._params_json.encode())
+        return h.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.root, key[:2], key + ".npy")
+
+    def get(self, key):
+        path = self.entry_path(key)
+        if not os.path.isfile(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def put(self, key, wav):
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(wav, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    def save_index(self):
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._digests, f)
+        os.replace(tmp_path, self._index_path)
+
+    # Returns the entry path for every source, filling misses in a pool;
+    # `compute(source_path)` must be picklable.
+    def build(self, sources, compute, num_proc=1, desc="Preprocessing"):
+        keys = [self.key(path) for path in sources]
+        self.save_index()
+
+        missing = {}
+        for path, key in zip(sources, keys):
+            if not os.path.isfile(self.entry_path(key)):
+                missing[key] = path
+
+        if missing:
+            print(f"{desc}: {len(missing)} of {len(keys)} clips not cached")
+            with Pool(num_proc) as pool:
+                results = pool.imap(
+                    _compute_entry, [(compute, p) for p in missing.values()]
+                )
+                for key, wav in tqdm(
+                    zip(missing, results), total=len(missing), desc=desc
+                ):
+                    self.put(key, wav)
+
+        return [self.entry_path(key) for key in keys]
+
+
+def _compute_entry(args):
+    compute, path = args
+    return compute(path)
@@ -0,0 +1,115 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+from torch import nn
+
+# Heads take pooled hidden states of shape (batch, layers, hidden).
+
+
+class LinearHead(nn.Module):
+    def __init__(self, num_layers, hidden_size, num_labels, layer=-1):
+        super().__init__()
+        self.layer = layer
+        self.classifier = nn.Linear(hidden_size, num_labels)
+
+    def forward(self, x):
+        return self.classifier(x[:, self.layer])
+
+
+class MLPHead(nn.Module):
+    def __init__(
+        self, num_layers, hidden_size, num_labels, layer=-1, width=256, dropout=0.2
+    ):
+        super().__init__()
+        self.layer = layer
+        self.mlp = nn.Sequential(
+            nn.Linear(hidden_size, width),
+            nn.GELU(),
+            nn.Dropout(dropout),
+            nn.Linear(width, num_labels),
+        )
+
+    def forward(self, x):
+        return self.mlp(x[:, self.layer])
+
+
+class WeightedLayerSumHead(nn.Module):
+    def __init__(self, num_layers, hidden_size, num_labels, dropout=0.1):
+        super().__init__()
+        self.layer_weights = nn.Parameter(torch.zeros(num_layers))
+        self.dropout = nn.Dropout(dropout)
+        self.classifier = nn.Linear(hidden_size, num_labels)
+
+    def forward(self, x):
+        weights = F.softmax(self.layer_weights, dim=0)
+        pooled = torch.einsum("blh,l->bh", x, weights)
+        return self.classifier(self.dropout(pooled))
+
+
+HEADS = {
+    "linear": LinearHead,
+    "mlp": MLPHead,
+    "weighted": WeightedLayerSumHead,
+}
+
+
+def class_weights(labels, num_labels):
+    counts = np.bincount(labels, minlength=num_labels).astype(np.float32)
+    return torch.from_numpy(counts.sum() / (num_labels * np.maximum(counts, 1)))
+
+
+def evaluate_head(head, x, y):
+    head.eval()
+    with torch.inference_mode():
+        preds = head(x).argmax(dim=-1).numpy()
+
+    _, _, f1, _ = precision_recall_fscore_support(
+        y.numpy(), preds, average="weighted", zero_division=0
+    )
+    return {"accuracy": accuracy_score(y.numpy(), preds), "f1": f1}
+
+
+def train_head(
+    kind,
+    train,
+    validation,
+    num_labels,
+    epochs=100,
+    batch_size=256,
+    lr=1e-3,
+    weight_decay=1e-2,
+    balanced=False,
+    patience=10,
+    seed=0,
+    **head_kwargs,
+):
+    torch.manual_seed(seed)
+    x, y = (torch.as_tensor(a) for a in train)
+    x_val, y_val = (torch.as_tensor(a) for a in validation)
+
+    head = HEADS[kind](x.shape[1], x.shape[2], num_labels, **head_kwargs)
+    optimizer = torch.optim.AdamW(head.parameters(), lr=lr, weight_decay=weight_decay)
+    weight = class_weights(y.numpy(), num_labels) if balanced else None
+
+    best, best_state, stale = None, None, 0
+    for epoch in range(epochs):
+        head.train()
+        for idx in torch.randperm(len(x)).split(batch_size):
+            loss = F.cross_entropy(head(x[idx]), y[idx], weight=weight)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+        metrics = evaluate_head(head, x_val, y_val)
+        if best is None or metrics["accuracy"] > best["accuracy"]:
+            best = {**metrics, "epoch": epoch}
+            best_state = {k: v.clone() for k, v in head.state_dict().items()}
+            stale = 0
+        else:
+            stale += 1
+            if stale >= patience:
+                break
+
+    head.load_state_dict(best_state)
+    return head, best
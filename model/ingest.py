@@ -0,0 +1,136 @@
+import glob
+import json
+import os
+from multiprocessing import Pool
+
+import librosa
+import numpy as np
+from dataset_util import index_datasets
+from tqdm import tqdm
+
+# 256 MB of float32 per shard file.
+SHARD_SAMPLES = 64 * 2**20
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return [path, stat.st_size, stat.st_mtime_ns]
+
+
+def _decode(args):
+    path, sample_rate = args
+    wav, _ = librosa.load(path, sr=sample_rate)
+    return np.asarray(wav, dtype=np.float32)
+
+
+# Every clip decoded and resampled once, stored back to back in raw float32
+# shard files. Clips are zero-copy slices of the memory-mapped shards.
+class Corpus:
+    def __init__(self, root):
+        with open(os.path.join(root, "manifest.json")) as f:
+            manifest = json.load(f)
+
+        self.root = root
+        self.sample_rate = manifest["sample_rate"]
+        self.emotion2id = manifest["emotion2id"]
+        self.clips = manifest["clips"]
+        self._shards = [
+            np.memmap(os.path.join(root, name), dtype=np.float32, mode="r")
+            for name in manifest["shards"]
+        ]
+        self._by_path = {clip["path"]: i for i, clip in enumerate(self.clips)}
+
+    def __len__(self):
+        return len(self.clips)
+
+    @property
+    def labels(self):
+        return [self.emotion2id[clip["emotion"]] for clip in self.clips]
+
+    def audio(self, idx):
+        clip = self.clips[idx]
+        start = clip["offset"]
+        return self._shards[clip["shard"]][start : start + clip["length"]]
+
+    def audio_for_path(self, path):
+        return self.audio(self._by_path[path])
+
+
+def _is_current(manifest_path, sources, sample_rate):
+    if not os.path.isfile(manifest_path):
+        return False
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    return manifest["sample_rate"] == sample_rate and manifest["sources"] == sources
+
+
+def ingest(dirs, root, sample_rate=16000, num_proc=1, shard_samples=SHARD_SAMPLES):
+    samples, emotion2id = index_datasets(dirs)
+    sources = [_source_stamp(s["audio"]) for s in samples]
+
+    manifest_path = os.path.join(root, "manifest.json")
+    if _is_current(manifest_path, sources, sample_rate):
+        return Corpus(root)
+
+    # The manifest is written last, so an interrupted build is never reused.
+    os.makedirs(root, exist_ok=True)
+    if os.path.isfile(manifest_path):
+        os.remove(manifest_path)
+    for path in glob.glob(os.path.join(root, "shard-*.f32")):
+        os.remove(path)
+
+    clips = []
+    shards = []
+    shard = None
+    filled = 0
+
+    try:
+        with Pool(num_proc) as pool:
+            decoded = pool.imap(
+                _decode, [(s["audio"], sample_rate) for s in samples], chunksize=8
+            )
+            for sample, wav in tqdm(
+                zip(samples, decoded), total=len(samples), desc="Ingesting"
+            ):
+                if shard is None or (filled and filled + len(wav) > shard_samples):
+                    if shard is not None:
+                        shard.close()
+                    shards.append(f"shard-{len(shards):05d}.f32")
+                    shard = open(os.path.join(root, shards[-1]), "wb")
+                    filled = 0
+
+                clips.append(
+                    {
+                        "path": sample["audio"],
+                        "corpus": sample["corpus"],
+                        "emotion": sample["emotion"],
+                        "shard": len(shards) - 1,
+                        "offset": filled,
+                        "length": len(wav),
+                        "duration": len(wav) / sample_rate,
+                    }
+                )
+                shard.write(wav.tobytes())
+                filled += len(wav)
+    finally:
+        if shard is not None:
+            shard.close()
+
+    manifest = {
+        "sample_rate": sample_rate,
+        "emotion2id": emotion2id,
+        "shards": shards,
+        "sources": sources,
+        "clips": clips,
+    }
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+    hours = sum(c["duration"] for c in clips) / 3600
+    print(f"Ingested {len(clips)} clips ({hours:.1f} h) into {len(shards)} shards")
+
+    return Corpus(root)
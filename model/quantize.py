@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import onnx
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+from export import MANIFESTS_DIR, artifact
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from train import N_PROC, OUT_DIR, load_splits, preprocess
+
+CALIBRATION_SAMPLES = 256
+
+# Quantizing the convolutional feature encoder costs far more accuracy than it
+# saves time; the transformer MatMuls are where the CPU time goes. Exported
+# WavLM graphs keep attention unfused (see export.py), so "Attention" only
+# matters for graphs where it was fused.
+DEFAULT_OP_TYPES = ["MatMul", "Attention"]
+
+
+class WaveformCalibrationReader(CalibrationDataReader):
+    def __init__(self, dataset, input_names):
+        self.dataset = dataset
+        self.input_names = input_names
+        self.index = 0
+
+    def get_next(self):
+        if self.index >= len(self.dataset):
+            return None
+
+        row = self.dataset[self.index]
+        self.index += 1
+
+        feeds = {"input_values": np.asarray(row["input_values"], np.float32)[None]}
+        if "attention_mask" in self.input_names:
+            feeds["attention_mask"] = np.asarray(row["attention_mask"], np.int64)[None]
+        return feeds
+
+    def rewind(self):
+        self.index = 0
+
+
+def calibration_set(n_samples):
+    dataset, _ = load_splits()
+
+    # Calibrate on training clips only so the test split stays unseen.
+    train = dataset["train"].shuffle(seed=67)
+    train = train.select(range(min(n_samples, len(train))))
+
+    return train.map(
+        preprocess,
+        num_proc=N_PROC,
+        remove_columns=["clip"],
+    )
+
+
+def quantize(
+    model_path,
+    out_path,
+    mode="dynamic",
+    op_types=None,
+    calibration_samples=CALIBRATION_SAMPLES,
+    calibration_method="minmax",
+):
+    op_types = op_types or DEFAULT_OP_TYPES
+
+    prepared_path = out_path + ".prep.onnx"
+    quant_pre_process(model_path, prepared_path, skip_symbolic_shape=True)
+
+    try:
+        match mode:
+            case "dynamic":
+                quantize_dynamic(
+                    prepared_path,
+                    out_path,
+                    op_types_to_quantize=op_types,
+                    per_channel=True,
+                    weight_type=QuantType.QInt8,
+                    use_external_data_format=False,
+                )
+            case "static":
+                input_names = {i.name for i in onnx.load(prepared_path).graph.input}
+                reader = WaveformCalibrationReader(
+                    calibration_set(calibration_samples), input_names
+                )
+                method = {
+                    "minmax": CalibrationMethod.MinMax,
+                    "entropy": CalibrationMethod.Entropy,
+                    "percentile": CalibrationMethod.Percentile,
+                }[calibration_method]
+
+                quantize_static(
+                    prepared_path,
+                    out_path,
+                    reader,
+                    quant_format=QuantFormat.QDQ,
+                    op_types_to_quantize=op_types,
+                    per_channel=True,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    calibrate_method=method,
+                )
+            case _:
+                raise ValueError(f"Unknown quantization mode: {mode}")
+    finally:
+        if os.path.isfile(prepared_path):
+            os.remove(prepared_path)
+
+    return out_path
+
+
+def int8_manifest(source, model_path, version, base_url):
+    # The registry serves one manifest per (name, version) and the service
+    # caches models by it, so the INT8 model is published as its own version.
+    # It shares the fp32 version's feature extractor and labels.
+    name = source["model"]["name"]
+    model = artifact(model_path, f"{base_url}/{name}/{version}")
+    return {
+        **source,
+        "model": {
+            **source["model"],
+            "version": version,
+            "sha256": model["sha256"],
+            "size_bytes": os.path.getsize(model_path),
+            "format": "onnx-int8",
+        },
+        "artifacts": {**source["artifacts"], "model": model},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=os.path.join(OUT_DIR, "model.onnx"))
+    parser.add_argument("--out", default=os.path.join(OUT_DIR, "model.int8.onnx"))
+    parser.add_argument("--mode", choices=["dynamic", "static"], default="dynamic")
+    parser.add_argument("--op-types", nargs="+", default=DEFAULT_OP_TYPES)
+    parser.add_argument("--calibration-samples", type=int, default=CALIBRATION_SAMPLES)
+    parser.add_argument(
+        "--calibration-method",
+        choices=["minmax", "entropy", "percentile"],
+        default="minmax",
+    )
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        help="fp32 manifest to publish the INT8 model alongside",
+    )
+    parser.add_argument("--version", default=None, help="defaults to <fp32>-int8")
+    parser.add_argument("--base-url", default="gs://tone-ml")
+    args = parser.parse_args()
+
+    quantize(
+        args.model,
+        args.out,
+        mode=args.mode,
+        op_types=args.op_types,
+        calibration_samples=args.calibration_samples,
+        calibration_method=args.calibration_method,
+    )
+
+    fp32_mb = os.path.getsize(args.model) / 2**20
+    int8_mb = os.path.getsize(args.out) / 2**20
+    print(f"{args.model}: {fp32_mb:.1f} MB -> {args.out}: {int8_mb:.1f} MB")
+
+    if args.manifest:
+        with open(args.manifest) as f:
+            source = json.load(f)
+        version = args.version or f"{source['model']['version']}-int8"
+        manifest_path = os.path.join(
+            MANIFESTS_DIR, f"{source['model']['name']}-{version}.json"
+        )
+        if os.path.exists(manifest_path):
+            raise FileExistsError(f"{manifest_path} exists; versions are immutable")
+
+        manifest = int8_manifest(source, args.out, version, args.base_url.rstrip("/"))
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.write("\n")
+        print(f"Wrote {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import numpy as np
+from torch.utils.data import Sampler
+
+
+def padding_waste(lengths, batches):
+    lengths = np.asarray(lengths)
+    padded = sum(int(lengths[b].max()) * len(b) for b in batches if len(b))
+    return 1 - lengths.sum() / padded if padded else 0.0
+
+
+def random_batches(n, batch_size, seed=0):
+    order = np.random.default_rng(seed).permutation(n)
+    return [order[i : i + batch_size] for i in range(0, n, batch_size)]
+
+
+# Batches of similar-length clips: indices are shuffled, cut into megabatches,
+# sorted by length within each, then split into batches whose order is
+# shuffled again. With `max_samples_per_batch`, batches grow until their
+# padded size (rows x longest clip) would exceed the budget, so short clips
+# travel in larger batches instead of a fixed `batch_size`.
+class LengthBucketSampler(Sampler):
+    def __init__(
+        self,
+        lengths,
+        batch_size=32,
+        max_samples_per_batch=None,
+        shuffle=True,
+        megabatch_size=1024,
+        seed=0,
+    ):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.max_samples_per_batch = max_samples_per_batch
+        self.shuffle = shuffle
+        self.megabatch_size = megabatch_size
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _split(self, indices):
+        if not self.max_samples_per_batch:
+            return [
+                indices[i : i + self.batch_size]
+                for i in range(0, len(indices), self.batch_size)
+            ]
+
+        # Indices arrive longest first, so each batch's first clip sets its
+        # padded length.
+        batches = []
+        start = 0
+        while start < len(indices):
+            longest = max(int(self.lengths[indices[start]]), 1)
+            size = max(1, self.max_samples_per_batch // longest)
+            batches.append(indices[start : start + size])
+            start += size
+        return batches
+
+    def batches(self, epoch=None):
+        epoch = self.epoch if epoch is None else epoch
+        rng = np.random.default_rng(self.seed + epoch)
+
+        if self.shuffle:
+            order = rng.permutation(len(self.lengths))
+            megabatches = [
+                order[i : i + self.megabatch_size]
+                for i in range(0, len(order), self.megabatch_size)
+            ]
+        else:
+            megabatches = [np.arange(len(self.lengths))]
+
+        batches = []
+        for megabatch in megabatches:
+            by_length = megabatch[np.argsort(-self.lengths[megabatch], kind="stable")]
+            batches += self._split(by_length)
+
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return batches
+
+    def padding_waste(self):
+        return padding_waste(self.lengths, self.batches())
+
+    def __iter__(self):
+        batches = self.batches()
+        # Trainer doesn't reliably forward set_epoch through accelerate's
+        # wrappers, so advance it here to reshuffle every epoch.
+        self.epoch += 1
+        for batch in batches:
+            yield batch.tolist()
+
+    def __len__(self):
+        return len(self.batches())
@@ -1,59 +1,56 @@
+import argparse
 import glob
 import os
 import shutil
 import urllib.request
 import zipfile
+from functools import cache, cached_property
 
 import evaluate
 import librosa
 import numpy as np
 import torch
-from audiomentations import AddGaussianNoise, Compose, Gain, PitchShift, TimeStretch
+from augment import BatchAugment
 from dataset_util import *
 from datasets import Audio, Dataset
+from feature_cache import FeatureCache
+from ingest import Corpus, ingest
 from sklearn.metrics import (
     accuracy_score,
     classification_report,
     precision_recall_fscore_support,
 )
 from tqdm import tqdm
+from trainer import AudioCollator, DistillationTrainer, ToneTrainer
 from transformers import (
     AutoFeatureExtractor,
-    DataCollatorWithPadding,
     EarlyStoppingCallback,
-    Trainer,
     TrainingArguments,
     WavLMForSequenceClassification,
 )
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CACHE_DIR = os.path.join(SCRIPT_DIR, ".cache")
+CORPUS_DIR = os.path.join(CACHE_DIR, "corpus")
 OUT_DIR = os.path.join(SCRIPT_DIR, "out")
 
 MODEL_NAME = "microsoft/wavlm-large"
+STUDENT_MODEL_NAME = "microsoft/wavlm-base-plus"
 BATCH_SIZE = 32
+# Cap on padded samples per batch (rows x longest clip); replaces the fixed
+# BATCH_SIZE when set, e.g. BATCH_SIZE * MAX_SAMPLES.
+MAX_BATCH_SAMPLES = None
 EPOCHS = 15
 LR = 2e-5
-MAX_SAMPLES = 16000 * 5
+SAMPLE_RATE = 16000
+MAX_SAMPLES = SAMPLE_RATE * 5
+TOP_DB = 30
 N_PROC = os.cpu_count() or 1
 
 os.makedirs(CACHE_DIR, exist_ok=True)
 
 feature_extractor = AutoFeatureExtractor.from_pretrained(MODEL_NAME)
 
-augment = Compose(
-    [
-        AddGaussianNoise(min_amplitude=0.001, max_amplitude=0.010, p=0.25),
-        TimeStretch(min_rate=0.8, max_rate=1.2, p=0.25),
-        PitchShift(min_semitones=-2, max_semitones=2, p=0.25),
-        Gain(min_gain_db=-6, max_gain_db=6, p=0.5),
-    ]
-)
-
-
-def augment_waveform(wav, sr):
-    return augment(samples=wav, sample_rate=sr)
-
 
 def compute_metrics(eval_pred):
     logits, labels = eval_pred
@@ -67,12 +64,8 @@ def compute_metrics(eval_pred):
     return {"accuracy": acc, "f1": f1, "precision": precision, "recall": recall}
 
 
-def preprocess(batch, train=False):
-    audio = batch["audio"]
-    wav = audio["array"]
-    sr = audio["sampling_rate"]
-
-    wav, _ = librosa.effects.trim(wav, top_db=30)
+def clean_waveform(wav):
+    wav, _ = librosa.effects.trim(wav, top_db=TOP_DB)
 
     if len(wav) > 0:
         wav = librosa.util.normalize(wav)
@@ -80,15 +73,25 @@ def preprocess(batch, train=False):
     if len(wav) > MAX_SAMPLES:
         wav = wav[:MAX_SAMPLES]
 
-    if train:
-        wav = augment_waveform(wav, sr)
+    return wav
+
+
+@cache
+def open_corpus():
+    # Opened lazily so dataset.map and pool workers map the shards themselves.
+    return Corpus(CORPUS_DIR)
+
+
+def load_clip(path):
+    return clean_waveform(np.asarray(open_corpus().audio_for_path(path)))
 
-    if len(wav) > MAX_SAMPLES:
-        wav = wav[:MAX_SAMPLES]
+
+def preprocess(batch):
+    wav = clean_waveform(np.asarray(open_corpus().audio(batch["clip"])))
 
     inputs = feature_extractor(
         wav,
-        sampling_rate=sr,
+        sampling_rate=SAMPLE_RATE,
         padding=False,
         return_attention_mask=True,
     )
@@ -98,19 +101,58 @@ def preprocess(batch, train=False):
     return batch
 
 
-def main():
-    base_dir = "data"
-
-    ravdess_dir = download_ravdess(base_dir)
-    tess_dir = download_tess(base_dir)
-    cremad_dir = download_cremad(base_dir)
-    emodb_dir = download_emodb(base_dir)
-
-    dataset, emotion2id = load_all_datasets(
-        ravdess_dir=ravdess_dir,
-        tess_dir=tess_dir,
-        cremad_dir=cremad_dir,
-        emodb_dir=emodb_dir,
+def feature_cache():
+    # Everything that changes the output of load_clip belongs in the key.
+    return FeatureCache(
+        os.path.join(CACHE_DIR, "features"),
+        {
+            "sample_rate": SAMPLE_RATE,
+            "max_samples": MAX_SAMPLES,
+            "top_db": TOP_DB,
+        },
+    )
+
+
+# Items are the cached clips as memory maps; padding, augmentation and
+# normalization happen per batch in the collator.
+class ClipDataset(torch.utils.data.Dataset):
+    def __init__(self, clip_paths, labels):
+        self.clip_paths = clip_paths
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.clip_paths)
+
+    @cached_property
+    def lengths(self):
+        return [np.load(p, mmap_mode="r").shape[0] for p in self.clip_paths]
+
+    def __getitem__(self, idx):
+        return {
+            "input_values": np.load(self.clip_paths[idx], mmap_mode="r"),
+            "label": self.labels[idx],
+        }
+
+
+def cached_split(split, cache, desc="Preprocessing"):
+    corpus = open_corpus()
+    sources = [corpus.clips[i]["path"] for i in split["clip"]]
+    clip_paths = cache.build(sources, load_clip, num_proc=N_PROC, desc=desc)
+    return ClipDataset(clip_paths, split["label"])
+
+
+def load_corpus(base_dir="data"):
+    dirs = download_all(base_dir)
+    return ingest(dirs, CORPUS_DIR, SAMPLE_RATE, num_proc=N_PROC)
+
+
+# Splits hold corpus clip indices; audio comes from the ingested shards.
+def load_splits(base_dir="data"):
+    corpus = load_corpus(base_dir)
+    emotion2id = corpus.emotion2id
+
+    dataset = Dataset.from_dict(
+        {"clip": list(range(len(corpus))), "label": corpus.labels}
     )
 
     split = dataset.train_test_split(test_size=0.2, seed=67)
@@ -122,32 +164,88 @@ def main():
         "test": split["test"],
     }
 
-    dataset["train"] = dataset["train"].map(
-        lambda x: preprocess(x, train=True),
-        num_proc=N_PROC,
-        remove_columns=["audio"],
-    )
+    return dataset, emotion2id
 
-    dataset["validation"] = dataset["validation"].map(
-        lambda x: preprocess(x, train=False),
-        num_proc=N_PROC,
-        remove_columns=["audio"],
-    )
 
-    dataset["test"] = dataset["test"].map(
-        lambda x: preprocess(x, train=False),
-        num_proc=N_PROC,
-        remove_columns=["audio"],
+def prune_layers(model, num_layers):
+    # Keeps evenly spaced transformer layers, always including the first,
+    # which owns WavLM's relative position bias.
+    layers = model.wavlm.encoder.layers
+    keep = np.linspace(0, len(layers) - 1, num_layers).round().astype(int)
+    model.wavlm.encoder.layers = torch.nn.ModuleList(layers[i] for i in keep)
+    model.config.num_hidden_layers = num_layers
+    return model
+
+
+def label_config(emotion2id):
+    # Stored in config.json so exports and manifests read the label order
+    # from the checkpoint instead of re-indexing the corpus.
+    return {
+        "num_labels": len(emotion2id),
+        "label2id": emotion2id,
+        "id2label": {i: emotion for emotion, i in emotion2id.items()},
+        "problem_type": "single_label_classification",
+    }
+
+
+def build_student(teacher_dir, student_name, num_layers, emotion2id):
+    if num_layers:
+        return prune_layers(
+            WavLMForSequenceClassification.from_pretrained(teacher_dir), num_layers
+        )
+
+    return WavLMForSequenceClassification.from_pretrained(
+        student_name, **label_config(emotion2id)
     )
 
-    model = WavLMForSequenceClassification.from_pretrained(
-        MODEL_NAME,
-        num_labels=len(emotion2id),
-        problem_type="single_label_classification",
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument(
+        "--distill",
+        metavar="TEACHER_DIR",
+        default=None,
+        help="train a student against this fine-tuned model's logits",
+    )
+    parser.add_argument("--student", default=STUDENT_MODEL_NAME)
+    parser.add_argument(
+        "--student-layers",
+        type=int,
+        default=None,
+        help="prune the teacher to this many layers instead of using --student",
     )
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    dataset, emotion2id = load_splits()
+    cache = feature_cache()
+
+    for name in ("train", "validation", "test"):
+        dataset[name] = cached_split(dataset[name], cache, desc=name)
+
+    if args.distill:
+        teacher = WavLMForSequenceClassification.from_pretrained(args.distill)
+        if teacher.config.num_labels != len(emotion2id):
+            raise ValueError(
+                f"Teacher has {teacher.config.num_labels} labels, "
+                f"dataset has {len(emotion2id)}"
+            )
+        model = build_student(
+            args.distill, args.student, args.student_layers, emotion2id
+        )
+    else:
+        model = WavLMForSequenceClassification.from_pretrained(
+            MODEL_NAME, **label_config(emotion2id)
+        )
 
     training_args = TrainingArguments(
-        output_dir="./checkpoints",
+        output_dir="./checkpoints-student" if args.distill else "./checkpoints",
         eval_strategy="epoch",
         save_strategy="epoch",
         learning_rate=LR,
@@ -167,23 +265,34 @@ def main():
         weight_decay=0.01,
     )
 
-    data_collator = DataCollatorWithPadding(
-        feature_extractor, padding=True, return_tensors="pt"
-    )
-
-    trainer = Trainer(
+    trainer_kwargs = {}
+    trainer_cls = ToneTrainer
+    if args.distill:
+        trainer_cls = DistillationTrainer
+        trainer_kwargs = {
+            "teacher": teacher,
+            "temperature": args.temperature,
+            "alpha": args.alpha,
+        }
+
+    # Augmentation runs on each padded training batch, so every epoch sees
+    # fresh variants; evaluation batches are only padded and normalized.
+    trainer = trainer_cls(
         model=model,
         args=training_args,
         train_dataset=dataset["train"],
         eval_dataset=dataset["validation"],
         compute_metrics=compute_metrics,
-        data_collator=data_collator,
+        data_collator=AudioCollator(MAX_SAMPLES, augment=BatchAugment()),
+        eval_data_collator=AudioCollator(MAX_SAMPLES),
+        max_batch_samples=MAX_BATCH_SAMPLES,
         callbacks=[EarlyStoppingCallback(early_stopping_patience=3)],
+        **trainer_kwargs,
     )
 
     trainer.train()
-    trainer.save_model(OUT_DIR)
-    feature_extractor.save_pretrained(OUT_DIR)
+    trainer.save_model(args.out_dir)
+    feature_extractor.save_pretrained(args.out_dir)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+from augment import normalize
+from sampling import LengthBucketSampler, padding_waste, random_batches
+from torch.utils.data import DataLoader
+from transformers import Trainer
+
+
+class AudioCollator:
+    def __init__(self, max_samples, augment=None):
+        self.max_samples = max_samples
+        self.augment = augment
+
+    def __call__(self, features):
+        lengths = torch.tensor([len(f["input_values"]) for f in features])
+        values = torch.zeros(len(features), int(lengths.max()), dtype=torch.float32)
+        for row, f in zip(values, features):
+            row[: len(f["input_values"])] = torch.from_numpy(
+                np.asarray(f["input_values"], dtype=np.float32)
+            )
+
+        if self.augment is not None:
+            values, lengths = self.augment(values, lengths)
+
+        if values.shape[1] > self.max_samples:
+            values = values[:, : self.max_samples]
+            lengths = lengths.clamp(max=self.max_samples)
+
+        input_values, attention_mask = normalize(values, lengths)
+
+        return {
+            "input_values": input_values,
+            "attention_mask": attention_mask,
+            "labels": torch.tensor([f["label"] for f in features]),
+        }
+
+
+# Trainer uses one collator for every loader; evaluation and prediction get
+# their own so they are never augmented. Datasets that expose per-item
+# `lengths` are batched by length for training and evaluation; prediction
+# keeps dataset order.
+class ToneTrainer(Trainer):
+    def __init__(
+        self, *args, eval_data_collator=None, max_batch_samples=None, **kwargs
+    ):
+        super().__init__(*args, **kwargs)
+        self.eval_data_collator = eval_data_collator
+        self.max_batch_samples = max_batch_samples
+
+    def _with_eval_collator(self, get_dataloader, *args, **kwargs):
+        if self.eval_data_collator is None:
+            return get_dataloader(*args, **kwargs)
+
+        train_collator = self.data_collator
+        self.data_collator = self.eval_data_collator
+        try:
+            return get_dataloader(*args, **kwargs)
+        finally:
+            self.data_collator = train_collator
+
+    def _bucketed_dataloader(self, dataset, batch_size, collator, shuffle, name):
+        sampler = LengthBucketSampler(
+            dataset.lengths,
+            batch_size=batch_size,
+            max_samples_per_batch=self.max_batch_samples,
+            shuffle=shuffle,
+            seed=self.args.seed,
+        )
+
+        baseline = padding_waste(
+            dataset.lengths, random_batches(len(dataset), batch_size, self.args.seed)
+        )
+        print(
+            f"{name}: {len(sampler)} batches, padding waste "
+            f"{sampler.padding_waste():.1%} (random batches of {batch_size}: "
+            f"{baseline:.1%})"
+        )
+
+        loader = DataLoader(
+            dataset,
+            batch_sampler=sampler,
+            collate_fn=collator,
+            num_workers=self.args.dataloader_num_workers,
+            pin_memory=self.args.dataloader_pin_memory,
+        )
+        return self.accelerator.prepare(loader)
+
+    def get_train_dataloader(self):
+        if not hasattr(self.train_dataset, "lengths"):
+            return super().get_train_dataloader()
+
+        return self._bucketed_dataloader(
+            self.train_dataset,
+            self._train_batch_size,
+            self.data_collator,
+            shuffle=True,
+            name="train",
+        )
+
+    def get_eval_dataloader(self, eval_dataset=None):
+        dataset = eval_dataset if eval_dataset is not None else self.eval_dataset
+        if not hasattr(dataset, "lengths"):
+            return self._with_eval_collator(super().get_eval_dataloader, eval_dataset)
+
+        return self._bucketed_dataloader(
+            dataset,
+            self.args.eval_batch_size,
+            self.eval_data_collator or self.data_collator,
+            shuffle=False,
+            name="eval",
+        )
+
+    def get_test_dataloader(self, test_dataset):
+        return self._with_eval_collator(super().get_test_dataloader, test_dataset)
+
+
+# Trains against a frozen teacher's softened logits as well as the labels.
+# Evaluation uses the plain cross-entropy loss and never runs the teacher.
+class DistillationTrainer(ToneTrainer):
+    def __init__(self, *args, teacher, temperature=2.0, alpha=0.5, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.teacher = teacher.to(self.args.device).eval()
+        self.teacher.requires_grad_(False)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        if not model.training:
+            return super().compute_loss(model, inputs, return_outputs, **kwargs)
+
+        outputs = model(**inputs)
+
+        with torch.no_grad():
+            teacher_logits = self.teacher(
+                input_values=inputs["input_values"],
+                attention_mask=inputs["attention_mask"],
+            ).logits
+
+        t = self.temperature
+        kd_loss = F.kl_div(
+            F.log_softmax(outputs.logits / t, dim=-1),
+            F.log_softmax(teacher_logits / t, dim=-1),
+            log_target=True,
+            reduction="batchmean",
+        ) * (t * t)
+        loss = self.alpha * kd_loss + (1 - self.alpha) * outputs.loss
+
+        return (loss, outputs) if return_outputs else loss
@@ -0,0 +1,74 @@
+import numpy as np
+
+from .buffer import AudioBuffer
+
+try:
+    import opuslib
+except Exception:
+    # Missing package or missing libopus; only the Opus format is affected.
+    opuslib = None
+
+# The longest Opus packet is 120 ms.
+OPUS_MAX_FRAME_MS = 120
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def _pcm(data: bytes, dtype: str) -> np.ndarray:
+    size = np.dtype(dtype).itemsize
+    if len(data) % size:
+        raise DecodeError(f"PCM message of {len(data)} bytes is not whole samples")
+    return np.frombuffer(data, dtype=dtype)
+
+
+class PcmF32Decoder:
+    def decode_into(self, data: bytes, buffer: AudioBuffer) -> int:
+        samples = _pcm(data, "<f4")
+        buffer.append(samples)
+        return samples.shape[0]
+
+
+class PcmS16Decoder:
+    def decode_into(self, data: bytes, buffer: AudioBuffer) -> int:
+        samples = _pcm(data, "<i2")
+        n = samples.shape[0]
+        # Convert while writing into the buffer: no intermediate float array.
+        np.multiply(samples, 1 / 32768, out=buffer.writable(n), casting="unsafe")
+        buffer.commit(n)
+        return n
+
+
+class OpusDecoder:
+    def __init__(self, sample_rate: int):
+        if opuslib is None:
+            raise RuntimeError("Opus support requires opuslib and libopus")
+
+        self.decoder = opuslib.Decoder(sample_rate, 1)
+        self.max_frame = sample_rate * OPUS_MAX_FRAME_MS // 1000
+
+    def decode_into(self, data: bytes, buffer: AudioBuffer) -> int:
+        try:
+            pcm = self.decoder.decode_float(data, self.max_frame, decode_fec=False)
+        except opuslib.OpusError as e:
+            raise DecodeError(f"Invalid Opus packet: {e}")
+        samples = np.frombuffer(pcm, dtype=np.float32)
+        buffer.append(samples)
+        return samples.shape[0]
+
+
+FORMATS = {
+    "f32": lambda sample_rate: PcmF32Decoder(),
+    "s16": lambda sample_rate: PcmS16Decoder(),
+    "opus": OpusDecoder,
+}
+
+
+def create_decoder(format: str, sample_rate: int):
+    try:
+        factory = FORMATS[format]
+    except KeyError:
+        raise ValueError(f"Unsupported audio format: {format}")
+
+    return factory(sample_rate)
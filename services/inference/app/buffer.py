@@ -0,0 +1,117 @@
+from typing import Iterator
+
+import numpy as np
+
+
+class AudioBuffer:
+    def __init__(self, capacity: int = 16000, max_capacity: int | None = None):
+        self.capacity = capacity
+        self.max_capacity = max_capacity
+
+        self._data = np.empty(capacity, dtype=np.float32)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def _reserve(self, n: int) -> None:
+        if self._end + n <= self._data.size:
+            return
+
+        size = len(self)
+        at_max = self.max_capacity is not None and self._data.size >= self.max_capacity
+
+        if size + n <= self._data.size // 2 or (at_max and size + n <= self._data.size):
+            # Enough room once the consumed prefix is dropped.
+            self._data[:size] = self._data[self._start : self._end]
+        else:
+            new_size = max(self._data.size * 2, size + n)
+            if self.max_capacity is not None:
+                if size + n > self.max_capacity:
+                    raise OverflowError(
+                        f"Audio buffer exceeds {self.max_capacity} samples"
+                    )
+                new_size = min(new_size, self.max_capacity)
+
+            data = np.empty(new_size, dtype=np.float32)
+            data[:size] = self._data[self._start : self._end]
+            self._data = data
+
+        self._start = 0
+        self._end = size
+
+    # Uninitialized view over the next `n` samples; `commit(n)` once filled.
+    def writable(self, n: int) -> np.ndarray:
+        self._reserve(n)
+        return self._data[self._end : self._end + n]
+
+    def commit(self, n: int) -> None:
+        self._end += n
+
+    def append(self, samples: np.ndarray) -> None:
+        n = samples.shape[0]
+        self.writable(n)[:] = samples
+        self.commit(n)
+
+    def view(self) -> np.ndarray:
+        return self._data[self._start : self._end]
+
+    # Consumes full chunks; each view is valid until the next write.
+    def chunks(self, size: int) -> Iterator[np.ndarray]:
+        while len(self) >= size:
+            chunk = self._data[self._start : self._start + size]
+            self._start += size
+            yield chunk
+
+    def clear(self) -> None:
+        self._start = 0
+        self._end = 0
+
+    # Hands the samples over without copying and starts on fresh storage.
+    def detach(self) -> np.ndarray:
+        samples = self.view()
+        self._data = np.empty(self.capacity, dtype=np.float32)
+        self.clear()
+        return samples
+
+
+class RingBuffer:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+
+        # Every sample is stored twice, `capacity` apart, so the newest
+        # `capacity` samples are always contiguous and can be viewed directly.
+        self._data = np.zeros(2 * capacity, dtype=np.float32)
+        self._pos = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, samples: np.ndarray) -> None:
+        cap = self.capacity
+        n = samples.shape[0]
+        if n >= cap:
+            samples = samples[-cap:]
+            n = cap
+
+        first = min(n, cap - self._pos)
+        rest = n - first
+
+        self._data[self._pos : self._pos + first] = samples[:first]
+        self._data[self._pos + cap : self._pos + cap + first] = samples[:first]
+        if rest:
+            self._data[:rest] = samples[first:]
+            self._data[cap : cap + rest] = samples[first:]
+
+        self._pos = (self._pos + n) % cap
+        self._size = min(self._size + n, cap)
+
+    def view(self) -> np.ndarray:
+        start = (self._pos - self._size) % self.capacity
+        return self._data[start : start + self._size]
+
+    def clear(self) -> None:
+        self._pos = 0
+        self._size = 0
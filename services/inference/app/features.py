@@ -0,0 +1,56 @@
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+
+@dataclass
+class FeatureConfig:
+    sampling_rate: int = 16000
+    do_normalize: bool = True
+    padding_value: float = 0.0
+
+    @classmethod
+    def from_pretrained(cls, model_dir: Path) -> "FeatureConfig":
+        path = model_dir / "preprocessor_config.json"
+        if not path.exists():
+            return cls()
+
+        config = json.loads(path.read_text())
+        return cls(
+            sampling_rate=config.get("sampling_rate", cls.sampling_rate),
+            do_normalize=config.get("do_normalize", cls.do_normalize),
+            padding_value=config.get("padding_value", cls.padding_value),
+        )
+
+
+def prepare_batch(
+    waveforms: list[np.ndarray], sample_rate: int, config: FeatureConfig
+) -> tuple[np.ndarray, np.ndarray]:
+    # Same output as Wav2Vec2FeatureExtractor(padding=True,
+    # return_attention_mask=True), computed for the whole padded batch at once.
+    if sample_rate != config.sampling_rate:
+        raise ValueError(
+            f"Expected {config.sampling_rate} Hz audio, got {sample_rate} Hz"
+        )
+
+    lengths = np.array([w.shape[0] for w in waveforms])
+    values = np.zeros((len(waveforms), lengths.max()), dtype=np.float32)
+    for row, waveform in zip(values, waveforms):
+        row[: waveform.shape[0]] = waveform
+
+    mask = np.arange(values.shape[1]) < lengths[:, None]
+
+    if config.do_normalize:
+        n = lengths[:, None].astype(np.float32)
+        mean = values.sum(axis=1, keepdims=True) / n
+        values -= mean
+        values *= mask
+        var = np.einsum("ij,ij->i", values, values)[:, None] / n
+        values /= np.sqrt(var + 1e-7)
+
+    if config.padding_value:
+        values[~mask] = config.padding_value
+
+    return values, mask.astype(np.int64)
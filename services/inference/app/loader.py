@@ -1,40 +1,166 @@
 import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, Iterator
 from urllib.parse import urlparse
 
 import requests
-from google.cloud import storage
 
+CHUNK_SIZE = 1 << 20
 
-def sha256_file(path: Path) -> str:
-    h = hashlib.sha256()
+# A fetcher streams the object at `url` starting from byte `offset`. It returns
+# the offset it actually starts from (0 when the source can't resume) and an
+# iterator over the bytes.
+Fetcher = Callable[[str, int], tuple[int, Iterator[bytes]]]
+
+
+def fetch_gcs(url: str, offset: int) -> tuple[int, Iterator[bytes]]:
+    from google.cloud import storage
+
+    p = urlparse(url)
+    bucket_name = p.netloc
+    blob_name = p.path.lstrip("/")
+
+    client = storage.Client()
+    bucket = client.bucket(bucket_name)
+    blob = bucket.blob(blob_name)
+
+    if not blob.exists():
+        raise FileNotFoundError(f"{url} does not exist")
+
+    def chunks():
+        with blob.open("rb", chunk_size=CHUNK_SIZE) as f:
+            f.seek(offset)
+            yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+
+    return offset, chunks()
+
+
+def fetch_http(url: str, offset: int) -> tuple[int, Iterator[bytes]]:
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    res = requests.get(url, headers=headers, stream=True, timeout=30)
+
+    # Nothing left past `offset`: the part file is already complete and only
+    # needs verifying.
+    if res.status_code == 416 and offset:
+        res.close()
+        return offset, iter(())
+
+    res.raise_for_status()
+
+    # A 200 means the server ignored the range and is sending everything.
+    start = offset if res.status_code == 206 else 0
+
+    def chunks():
+        with res:
+            yield from res.iter_content(CHUNK_SIZE)
+
+    return start, chunks()
+
+
+def fetch_file(url: str, offset: int) -> tuple[int, Iterator[bytes]]:
+    path = Path(urlparse(url).path if url.startswith("file:") else url)
+
+    def chunks():
+        with path.open("rb") as f:
+            f.seek(offset)
+            yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+
+    return offset, chunks()
+
+
+FETCHERS: dict[str, Fetcher] = {
+    "gcs": fetch_gcs,
+    "http": fetch_http,
+    "https": fetch_http,
+    "file": fetch_file,
+}
+
+
+def register_fetcher(type: str, fetcher: Fetcher) -> None:
+    FETCHERS[type] = fetcher
+
+
+def sha256_file(path: Path, h=None) -> str:
+    h = h or hashlib.sha256()
     with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
             h.update(chunk)
     return h.hexdigest()
 
 
+def _stamp_path(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".verified")
+
+
+def _write_stamp(dest: Path, sha256: str) -> None:
+    st = dest.stat()
+    stamp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256}
+    _stamp_path(dest).write_text(json.dumps(stamp))
+
+
+def _is_verified(dest: Path, expected_sha256: str) -> bool:
+    # The stamp records what the file looked like when it was last hashed, so
+    # warm starts only stat the file instead of reading all of it.
+    try:
+        stamp = json.loads(_stamp_path(dest).read_text())
+        st = dest.stat()
+    except (OSError, ValueError):
+        return False
+
+    return (
+        stamp.get("size") == st.st_size
+        and stamp.get("mtime_ns") == st.st_mtime_ns
+        and (not expected_sha256 or stamp.get("sha256") == expected_sha256)
+    )
+
+
 def download_file(url: str, type: str, dest: Path, expected_sha256: str = ""):
     dest.parent.mkdir(parents=True, exist_ok=True)
 
-    if dest.exists() and expected_sha256 and sha256_file(dest) == expected_sha256:
+    if _is_verified(dest, expected_sha256):
         return dest
-    match type:
-        case "gcs":
-            p = urlparse(url)
-            bucket_name = p.netloc
-            blob_name = p.path.lstrip("/")
 
-            client = storage.Client()
-            bucket = client.bucket(bucket_name)
-            blob = bucket.blob(blob_name)
+    if dest.exists():
+        # Cached before stamps existed, or touched since: hash it once.
+        digest = sha256_file(dest)
+        if not expected_sha256 or digest == expected_sha256:
+            _write_stamp(dest, digest)
+            return dest
+        dest.unlink()
+
+    try:
+        fetcher = FETCHERS[type]
+    except KeyError:
+        raise ValueError(f"Unsupported artifact type: {type}")
 
-            if blob.exists():
-                blob.download_to_filename(dest)
+    part = dest.with_name(dest.name + ".part")
+    offset = part.stat().st_size if part.exists() else 0
 
-    if expected_sha256 and sha256_file(dest) != expected_sha256:
+    h = hashlib.sha256()
+    start, chunks = fetcher(url, offset)
+    if start == offset and offset:
+        sha256_file(part, h)
+    else:
+        start = 0
+
+    with part.open("r+b" if start else "wb") as f:
+        f.seek(start)
+        f.truncate()
+        for chunk in chunks:
+            h.update(chunk)
+            f.write(chunk)
+
+    digest = h.hexdigest()
+    if expected_sha256 and digest != expected_sha256:
+        part.unlink()
         raise RuntimeError(f"SHA256 mismatch for {dest}")
 
+    os.replace(part, dest)
+    _write_stamp(dest, digest)
+
     return dest
 
 
@@ -46,30 +172,44 @@ def get_manifest(registry: str, model_name: str, model_version: str):
     return res.json()
 
 
-def get_artifacts(manifest, cache_dir: Path):
+def get_artifacts(manifest, cache_dir: Path, max_workers: int = 4):
     artifacts = manifest.get("artifacts", {})
     model_dir = (
         cache_dir / f"{manifest['model']['name']}-{manifest['model']['version']}"
     )
     local_paths = {}
 
-    for key, info in artifacts.items():
-        url = info["url"]
-        sha = info["sha256"]
-        type = info["type"]
-        filename = Path(url).name
-        dest = model_dir / filename
-        download_file(url, type, dest, expected_sha256=sha)
-        local_paths[key] = dest
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for key, info in artifacts.items():
+            url = info["url"]
+            sha = info["sha256"]
+            type = info["type"]
+            filename = Path(url).name
+            dest = model_dir / filename
+            futures[key] = pool.submit(
+                download_file, url, type, dest, expected_sha256=sha
+            )
+
+        for key, future in futures.items():
+            local_paths[key] = future.result()
 
     return local_paths
 
 
-def load(registry: str, model_name: str, model_version: str, cache_dir: Path):
+def load(
+    registry: str,
+    model_name: str,
+    model_version: str,
+    cache_dir: Path,
+    max_workers: int = 4,
+):
     manifest = get_manifest(
         registry=registry, model_name=model_name, model_version=model_version
     )
 
-    files = get_artifacts(manifest=manifest, cache_dir=cache_dir)
+    files = get_artifacts(
+        manifest=manifest, cache_dir=cache_dir, max_workers=max_workers
+    )
 
     return files, manifest
@@ -1,52 +1,97 @@
 import asyncio
 import io
+import json
 import os
+import time
 import uuid
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Awaitable, Callable
 
 import numpy as np
+import requests
 import soundfile as sf
 import torch
 import torch.nn.functional as F
 from fastapi import (
     FastAPI,
+    Response,
     File,
     HTTPException,
     UploadFile,
     WebSocket,
     WebSocketDisconnect,
 )
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from silero_vad import get_speech_timestamps, load_silero_vad, read_audio
 
-from .loader import load
-from .registry import get_model_loader
-
-app = FastAPI()
-
+from .audio_formats import FORMATS, DecodeError, create_decoder
+from .buffer import AudioBuffer, RingBuffer
+from .loader import get_artifacts, get_manifest
+from .metrics import (
+    ACTIVE_SESSIONS,
+    MODEL_LOAD_SECONDS,
+    REJECTED_SESSIONS,
+    SHED_PREDICTIONS,
+    SLOW_DOWN,
+    STAGES,
+    TRUNCATED_UTTERANCES,
+    UTTERANCE_SECONDS,
+    monitor_event_loop,
+    render,
+)
+from .models import (
+    LoadedModel,
+    ModelCache,
+    ModelCacheFull,
+    current_rss_bytes,
+    manifest_labels,
+)
+from .offline import decode_and_segment
+from .registry import MODEL_REGISTRY
+from .scheduler import InferenceScheduler
+from .startup import Startup
+from .vad import BatchedVAD
+from .windowing import aggregate_results
+from .workers import create_executor
 
 REGISTRY_URL = os.getenv("REGISTRY_URL", "http://tone-registry-service:80")
 MODEL_NAME = os.getenv("MODEL_NAME", "tone")
 MODEL_VERSION = os.getenv("MODEL_VERSION", "1.0.2")
 CACHE_PATH = Path(os.getenv("MODEL_CACHE_PATH", "/cache/models"))
-
-artifacts, manifest = load(
-    REGISTRY_URL,
-    MODEL_NAME,
-    MODEL_VERSION,
-    CACHE_PATH,
-)
-model_dir = Path(artifacts["model"]).parent
-loader = get_model_loader(manifest)
-loader.load(model_dir)
-
-silero, utils = torch.hub.load(
-    repo_or_dir="snakers4/silero-vad",
-    model="silero_vad",
-    force_reload=False,
-    trust_repo=True,
-)
-(get_speech_timestamps, save_audio, read_audio, VADIterator, collect_chunks) = utils
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+INFER_MAX_BATCH_SIZE = int(os.getenv("INFER_MAX_BATCH_SIZE", "8"))
+INFER_MAX_WAIT_MS = float(os.getenv("INFER_MAX_WAIT_MS", "10"))
+INFER_EXECUTOR = os.getenv("INFER_EXECUTOR", "thread")
+INFER_WORKERS = int(os.getenv("INFER_WORKERS", str(min(4, os.cpu_count() or 1))))
+INFER_QUEUE_SIZE = int(os.getenv("INFER_QUEUE_SIZE", "64"))
+VAD_MAX_BATCH_SIZE = int(os.getenv("VAD_MAX_BATCH_SIZE", "512"))
+VAD_TICK_MS = float(os.getenv("VAD_TICK_MS", "10"))
+VAD_MAX_CHUNKS_PER_TICK = int(os.getenv("VAD_MAX_CHUNKS_PER_TICK", "32"))
+INFER_WINDOW_S = float(os.getenv("INFER_WINDOW_S", "5"))
+INFER_WINDOW_HOP_S = float(os.getenv("INFER_WINDOW_HOP_S", "2.5"))
+INFER_AGGREGATE = os.getenv("INFER_AGGREGATE", "mean")
+PARTIAL_WINDOW_S = float(os.getenv("PARTIAL_WINDOW_S", "3"))
+PARTIAL_STRIDE_S = float(os.getenv("PARTIAL_STRIDE_S", "1"))
+WS_READY_WAIT_S = float(os.getenv("WS_READY_WAIT_S", "10"))
+STARTUP_MAX_BACKOFF_S = float(os.getenv("STARTUP_MAX_BACKOFF_S", "60"))
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", str(os.cpu_count() or 1)))
+CLASSIFY_MAX_SEGMENT_S = float(os.getenv("CLASSIFY_MAX_SEGMENT_S", "30"))
+# Models clients may select with ?model=&version=, as "name:version,...".
+SERVED_MODELS = {
+    tuple(entry.strip().split(":", 1))
+    for entry in os.getenv("SERVED_MODELS", f"{MODEL_NAME}:{MODEL_VERSION}").split(",")
+    if entry.strip()
+} | {(MODEL_NAME, MODEL_VERSION)}
+# Per-pod and per-session admission limits for /v1/ws; 0 disables a limit.
+WS_MAX_SESSIONS = int(os.getenv("WS_MAX_SESSIONS", "64"))
+WS_MAX_UTTERANCE_S = float(os.getenv("WS_MAX_UTTERANCE_S", "30"))
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "4"))
+WS_MAX_MESSAGE_S = float(os.getenv("WS_MAX_MESSAGE_S", "10"))
+WS_DRAIN_TIMEOUT_S = float(os.getenv("WS_DRAIN_TIMEOUT_S", "10"))
 
 SAMPLE_RATE = 16000
 CHUNK_SIZE = 512
@@ -55,108 +100,662 @@ FRAME_MS = (CHUNK_SIZE / SAMPLE_RATE) * 1000
 NUM_PRE_ROLL_FRAMES = int(PRE_ROLL_MS // FRAME_MS)
 MIN_UTTERANCE_LEN = SAMPLE_RATE  # 1 sec
 
+for name, version in SERVED_MODELS:
+    if version not in MODEL_REGISTRY.get(name, {}):
+        raise ValueError(f"SERVED_MODELS lists unknown model {name} v{version}")
+# Without a budget every allowed model could end up resident at once.
+if len(SERVED_MODELS) > 1 and MODEL_MEMORY_BUDGET_MB <= 0:
+    raise ValueError("Serving several models requires MODEL_MEMORY_BUDGET_MB")
+
+startup = Startup()
+
+# Set by initialize() once the VAD model is loaded.
+vad: BatchedVAD | None = None
+
+# Sessions admitted to /v1/ws, including those still waiting for the model.
+ws_sessions = 0
+
+
+def _load_artifacts_and_model(manifest):
+    artifacts = get_artifacts(manifest, CACHE_PATH, max_workers=DOWNLOAD_WORKERS)
+    model_dir = Path(artifacts["model"]).parent
+    artifact_bytes = sum(Path(p).stat().st_size for p in artifacts.values())
+
+    download_done = time.perf_counter()
+    executor, infer_batch = create_executor(
+        INFER_EXECUTOR, INFER_WORKERS, manifest, model_dir
+    )
+
+    return executor, infer_batch, artifact_bytes, download_done
+
+
+async def load_model(name: str, version: str) -> LoadedModel:
+    start = time.perf_counter()
+    manifest = await asyncio.to_thread(get_manifest, REGISTRY_URL, name, version)
+    manifest_done = time.perf_counter()
+
+    await models.reserve(manifest["model"].get("size_bytes", 0))
+
+    rss_before = current_rss_bytes()
+    executor, infer_batch, artifact_bytes, download_done = await asyncio.to_thread(
+        _load_artifacts_and_model, manifest
+    )
+    resident_bytes = current_rss_bytes() - rss_before
+    if INFER_EXECUTOR == "process":
+        resident_bytes = artifact_bytes * INFER_WORKERS
+    elif resident_bytes <= 0:
+        resident_bytes = artifact_bytes
+
+    scheduler = InferenceScheduler(
+        infer_batch,
+        SAMPLE_RATE,
+        executor=executor,
+        max_batch_size=INFER_MAX_BATCH_SIZE,
+        max_wait_ms=INFER_MAX_WAIT_MS,
+        max_queue_size=INFER_QUEUE_SIZE,
+        max_concurrency=INFER_WORKERS,
+        window=int(INFER_WINDOW_S * SAMPLE_RATE) if INFER_WINDOW_S > 0 else None,
+        hop=int(INFER_WINDOW_HOP_S * SAMPLE_RATE),
+        aggregate=INFER_AGGREGATE,
+        model_key=(name, version),
+    )
+    scheduler.start()
+
+    timings = {
+        "manifest": manifest_done - start,
+        "artifacts": download_done - manifest_done,
+        "model": time.perf_counter() - download_done,
+    }
+    for phase, seconds in timings.items():
+        MODEL_LOAD_SECONDS.labels(name, version, phase).set(seconds)
 
-@app.websocket("/v1/ws")
-async def stream(websocket: WebSocket):
+    return LoadedModel(
+        name=name,
+        version=version,
+        manifest=manifest,
+        executor=executor,
+        scheduler=scheduler,
+        resident_bytes=resident_bytes,
+        timings=timings,
+    )
+
+
+models = ModelCache(load_model, budget_bytes=int(MODEL_MEMORY_BUDGET_MB * 2**20))
+
+decode_executor = ThreadPoolExecutor(
+    max_workers=DECODE_WORKERS, thread_name_prefix="decode"
+)
+
+
+async def initialize():
+    global vad
+
+    # Loading happens off the event loop so health checks answer meanwhile; a
+    # slow or unreachable registry is retried instead of crashing the pod.
+    backoff = 1.0
+    while True:
+        try:
+            if vad is None:
+                with startup.track("vad"):
+                    silero = await asyncio.to_thread(load_silero_vad, onnx=True)
+                vad = BatchedVAD(
+                    silero.session,
+                    sample_rate=SAMPLE_RATE,
+                    chunk_size=CHUNK_SIZE,
+                    max_batch_size=VAD_MAX_BATCH_SIZE,
+                    max_chunks_per_tick=VAD_MAX_CHUNKS_PER_TICK,
+                    tick_ms=VAD_TICK_MS,
+                )
+                vad.start()
+
+            # Other models load lazily when a session asks for them.
+            with startup.track("default_model"):
+                model = await models.acquire(MODEL_NAME, MODEL_VERSION)
+                await models.release(model)
+            startup.timings.update(model.timings)
+            break
+        except Exception as e:
+            startup.fail(e)
+            print(f"Startup failed ({startup.error}); retrying in {backoff:.0f}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, STARTUP_MAX_BACKOFF_S)
+
+    startup.mark_ready()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_task = asyncio.create_task(initialize())
+    lag_task = asyncio.create_task(monitor_event_loop())
+    yield
+    for task in (init_task, lag_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    if vad is not None:
+        await vad.stop()
+    await models.close()
+    decode_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def to_predictions(results: dict, sorted_labels: list[str]) -> list[dict]:
+    logits = torch.tensor(results["scores"])
+    probs = F.softmax(logits, dim=0)
+
+    return [
+        {"label": sorted_labels[i], "score": probs[i].item()}
+        for i in range(len(sorted_labels))
+    ]
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok", **startup.status()}
+
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    if not startup.ready.is_set():
+        response.status_code = 503
+    return startup.status()
+
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render()
+    return Response(body, media_type=content_type)
+
+
+def is_served(name: str, version: str) -> bool:
+    return (name, version) in SERVED_MODELS
+
+
+async def reject(websocket: WebSocket, code: int, reason: str) -> None:
+    # Closing before accept fails the handshake with a bare 403, so accept
+    # first: clients can then tell "retry later" (1013) from "don't retry".
     await websocket.accept()
+    await websocket.close(code=code, reason=reason)
 
-    triggered = False
 
-    ring_buffer = deque(maxlen=NUM_PRE_ROLL_FRAMES)
+@app.websocket("/v1/ws")
+async def stream(websocket: WebSocket):
+    global ws_sessions
 
-    audio_buffer = np.array([], dtype=np.float32)
+    # Fail fast rather than let a burst of clients share out the CPU until
+    # every session misses real time.
+    if WS_MAX_SESSIONS and ws_sessions >= WS_MAX_SESSIONS:
+        REJECTED_SESSIONS.labels("max_sessions").inc()
+        await reject(websocket, 1013, "Too many sessions")
+        return
 
-    vad_buffer = np.array([], dtype=np.float32)
+    ws_sessions += 1
+    try:
+        await serve_stream(websocket)
+    finally:
+        ws_sessions -= 1
+
+
+async def serve_stream(websocket: WebSocket):
+    params = websocket.query_params
+    model_name = params.get("model", MODEL_NAME)
+    model_version = params.get("version", MODEL_VERSION)
+    if not is_served(model_name, model_version):
+        await reject(websocket, 1008, "Unknown model")
+        return
+
+    if not startup.ready.is_set():
+        try:
+            await asyncio.wait_for(startup.ready.wait(), WS_READY_WAIT_S)
+        except asyncio.TimeoutError:
+            # 1013: try again later.
+            REJECTED_SESSIONS.labels("loading").inc()
+            await reject(websocket, 1013, "Model is loading")
+            return
+
+    audio_format = params.get("format", "f32")
+    if audio_format not in FORMATS:
+        await reject(websocket, 1008, "Unsupported audio format")
+        return
+    try:
+        decoder = create_decoder(audio_format, SAMPLE_RATE)
+    except RuntimeError as e:
+        await reject(websocket, 1003, str(e))
+        return
 
-    vad_iterator = VADIterator(silero)
+    partial = params.get("partial", "0").lower() in ("1", "true")
+    try:
+        window_len = int(float(params.get("window", PARTIAL_WINDOW_S)) * SAMPLE_RATE)
+        stride_len = int(float(params.get("stride", PARTIAL_STRIDE_S)) * SAMPLE_RATE)
+    except ValueError:
+        window_len = stride_len = 0
+    valid_window = window_len >= MIN_UTTERANCE_LEN and 0 < stride_len <= window_len
+    if partial and not valid_window:
+        await reject(websocket, 1008, "Invalid partial window/stride")
+        return
 
     try:
+        model = await models.acquire(model_name, model_version)
+    except ModelCacheFull:
+        REJECTED_SESSIONS.labels("model_cache_full").inc()
+        await reject(websocket, 1013, "Model cache is full")
+        return
+    except Exception as e:
+        print(f"Failed to load {model_name} v{model_version}: {e}")
+        await reject(websocket, 1011, "Model failed to load")
+        return
+
+    # Everything after the acquire sits inside the try so the lease is always
+    # released.
+    pending: set[asyncio.Task] = set()
+    accepted = False
+    drain = False
+    close_code, close_reason = 1000, None
+    try:
+        triggered = False
+
+        ring_buffer = RingBuffer(NUM_PRE_ROLL_FRAMES * CHUNK_SIZE)
+
+        max_utterance_len = int(WS_MAX_UTTERANCE_S * SAMPLE_RATE) or None
+        audio_buffer = AudioBuffer(SAMPLE_RATE * 4, max_capacity=max_utterance_len)
+
+        # Each message is decoded and drained through VAD before the next is read,
+        # so this bounds the audio a session can buffer ahead of the VAD.
+        max_pending = None
+        if WS_MAX_MESSAGE_S > 0:
+            max_pending = int(WS_MAX_MESSAGE_S * SAMPLE_RATE) + CHUNK_SIZE
+        vad_stream = vad.open(max_pending=max_pending)
+
+        # Partial windows for the current utterance, the number of samples they
+        # cover and where the next one starts.
+        windows: list[asyncio.Future] = []
+        covered = 0
+        next_partial_at = window_len
+
+        last_send: asyncio.Task | None = None
+        send_lock = asyncio.Lock()
+
+        # Inferences this session is waiting on; past WS_MAX_IN_FLIGHT, partials
+        # are skipped and finals wait, which stops reading from the socket.
+        in_flight: set[asyncio.Future] = set()
+        # Samples the VAD has consumed, for utterances cut before their end event.
+        stream_samples = 0
+
+        enqueue_wait = 0.0
+
+        def busy() -> bool:
+            return WS_MAX_IN_FLIGHT > 0 and len(in_flight) >= WS_MAX_IN_FLIGHT
+
+        async def send_json(message: dict):
+            async with send_lock:
+                await websocket.send_json(message)
+
+        async def enqueue(
+            waveform: np.ndarray, sheddable: bool = False
+        ) -> asyncio.Future | None:
+            nonlocal enqueue_wait
+
+            # Time blocked on a full scheduler queue or on this session's own
+            # backlog, kept out of "buffer".
+            start = time.perf_counter()
+            if busy():
+                if sheddable:
+                    SHED_PREDICTIONS.labels("in_flight").inc()
+                    return None
+
+                SLOW_DOWN.inc()
+                await send_json(
+                    {
+                        "type": "slow_down",
+                        "in_flight": len(in_flight),
+                        "max_in_flight": WS_MAX_IN_FLIGHT,
+                    }
+                )
+                while busy():
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+            future = await model.scheduler.enqueue(waveform)
+            in_flight.add(future)
+            future.add_done_callback(in_flight.discard)
+            enqueue_wait += time.perf_counter() - start
+            return future
+
+        async def send_prediction(
+            kind: str,
+            futures: list[asyncio.Future],
+            previous: asyncio.Task | None,
+            started: float | None,
+            extra: dict,
+        ):
+            try:
+                results = await asyncio.gather(*futures)
+            except Exception as e:
+                results = e
+
+            # Messages go out in the order they were queued, whichever inference
+            # finishes first.
+            if previous is not None:
+                await asyncio.wait([previous])
+
+            # Reported in place of the prediction; the session keeps streaming.
+            if isinstance(results, Exception):
+                print(f"Inference failed: {results!r}")
+                await send_json(
+                    {"type": "error", "for": kind, "detail": str(results), **extra}
+                )
+                return
+
+            # A later message is already queued, so this partial is stale.
+            if kind == "partial" and asyncio.current_task() is not last_send:
+                SHED_PREDICTIONS.labels("stale").inc()
+                return
+
+            with STAGES["postprocess"].time():
+                results = aggregate_results(results, INFER_AGGREGATE)
+                await send_json(
+                    {
+                        "type": kind,
+                        "predictions": to_predictions(results, model.labels),
+                        **extra,
+                    }
+                )
+
+            if started is not None:
+                STAGES["end_to_end"].observe(time.perf_counter() - started)
+
+        def deliver(
+            kind: str,
+            futures: list[asyncio.Future],
+            started: float | None = None,
+            **extra,
+        ):
+            nonlocal last_send
+
+            # Deliver the result from its own task so the receive loop keeps
+            # consuming and VAD-ing audio meanwhile.
+            task = asyncio.create_task(
+                send_prediction(kind, futures, last_send, started, extra)
+            )
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            last_send = task
+
+        await websocket.accept()
+        accepted = True
+        ACTIVE_SESSIONS.inc()
+
         while True:
             data = await websocket.receive_bytes()
             if not data:
+                drain = True
                 break
-
-            pcm_samples = np.frombuffer(data, dtype=np.float32)
-
-            if pcm_samples.size == 0:
+            received = time.perf_counter()
+
+            # Decoded straight into the session's VAD buffer.
+            try:
+                with STAGES["decode"].time():
+                    decoded = decoder.decode_into(data, vad_stream.pending)
+            except OverflowError:
+                close_code, close_reason = 1009, "Audio message too large"
+                drain = True
+                break
+            except DecodeError as e:
+                close_code, close_reason = 1007, str(e)
+                drain = True
+                break
+            if decoded == 0:
                 continue
 
-            vad_buffer = np.concatenate((vad_buffer, pcm_samples))
-
-            while len(vad_buffer) >= CHUNK_SIZE:
-                chunk = vad_buffer[:CHUNK_SIZE]
-                vad_buffer = vad_buffer[CHUNK_SIZE:]
+            with STAGES["vad"].time():
+                chunks = await vad.process(vad_stream)
 
-                speech_events = vad_iterator(chunk, return_seconds=False)
+            buffer_start = time.perf_counter()
+            enqueue_wait = 0.0
 
+            for chunk, speech_events in chunks:
+                stream_samples += len(chunk)
                 is_speech_start = speech_events is not None and "start" in speech_events
                 is_speech_end = speech_events is not None and "end" in speech_events
 
                 if is_speech_start and not triggered:
-                    if len(ring_buffer) > 0:
-                        audio_buffer = np.concatenate([audio_buffer, *ring_buffer])
+                    audio_buffer.append(ring_buffer.view())
                     ring_buffer.clear()
                     triggered = True
 
                 if triggered:
-                    audio_buffer = np.concatenate((audio_buffer, chunk))
-
-                    if is_speech_end:
-                        if audio_buffer.shape[0] < MIN_UTTERANCE_LEN:
-                            audio_buffer = np.array([], dtype=np.float32)
-                            triggered = False
-                            continue
-
-                        utterance_np = audio_buffer
-                        results = loader.infer(
-                            utterance_np,
-                            SAMPLE_RATE,
-                        )
-
-                        raw_labels = manifest["labels"]
-                        sorted_labels = [
-                            label
-                            for label, _ in sorted(
-                                raw_labels.items(), key=lambda x: x[1]
-                            )
-                        ]
-
-                        logits = torch.tensor(results["scores"])
-                        probs = F.softmax(logits, dim=0)
-
-                        predictions = [
-                            {"label": sorted_labels[i], "score": probs[i].item()}
-                            for i in range(len(sorted_labels))
-                        ]
-
-                        await websocket.send_json(
-                            {"type": "inference", "predictions": predictions}
-                        )
-
-                        audio_buffer = np.array([], dtype=np.float32)
-                        triggered = False
+                    audio_buffer.append(chunk)
+
+                    if partial and len(audio_buffer) >= next_partial_at:
+                        window = audio_buffer.view()[-window_len:].copy()
+                        future = await enqueue(window, sheddable=True)
+                        if future is not None:
+                            windows.append(future)
+                            deliver("partial", windows[-1:])
+                            covered = len(audio_buffer)
+                        next_partial_at = len(audio_buffer) + stride_len
+
+                    # Speech that runs into the buffer limit is sent as is and
+                    # the rest becomes a new utterance.
+                    truncated = (
+                        not is_speech_end
+                        and max_utterance_len is not None
+                        and len(audio_buffer) + CHUNK_SIZE > max_utterance_len
+                    )
+
+                    if is_speech_end or truncated:
+                        if len(audio_buffer) < MIN_UTTERANCE_LEN:
+                            audio_buffer.clear()
+                        else:
+                            utterance_np = audio_buffer.detach()
+
+                            # Reuse the partial windows and only encode the
+                            # tail they don't cover yet. A skipped partial
+                            # leaves a gap, so then encode it all.
+                            uncovered = len(utterance_np) - covered
+                            if windows and 0 < uncovered <= window_len:
+                                tail = utterance_np[-window_len:]
+                                windows.append(await enqueue(tail))
+                            elif not windows or uncovered > window_len:
+                                windows = [await enqueue(utterance_np)]
+                            UTTERANCE_SECONDS.observe(len(utterance_np) / SAMPLE_RATE)
+
+                            # Stream time of the utterance end, so clients
+                            # can line predictions up with their audio.
+                            if truncated:
+                                TRUNCATED_UTTERANCES.inc()
+                                extra = {
+                                    "end": stream_samples / SAMPLE_RATE,
+                                    "truncated": True,
+                                }
+                            else:
+                                extra = {"end": speech_events["end"] / SAMPLE_RATE}
+                            deliver("inference", windows, started=received, **extra)
+
+                        windows = []
+                        covered = 0
+                        next_partial_at = window_len
+                        triggered = truncated
 
                 else:
                     ring_buffer.append(chunk)
 
+            buffer_time = time.perf_counter() - buffer_start - enqueue_wait
+            STAGES["buffer"].observe(buffer_time)
+            if enqueue_wait:
+                STAGES["enqueue"].observe(enqueue_wait)
+
     except WebSocketDisconnect:
         print("WebSocket disconnected")
     finally:
-        await websocket.close()
+        if accepted:
+            ACTIVE_SESSIONS.dec()
+
+        # When the client ends the stream, predictions already queued for its
+        # last utterances still go out before the close.
+        if drain and pending:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*pending, return_exceptions=True),
+                    WS_DRAIN_TIMEOUT_S,
+                )
+            except asyncio.TimeoutError:
+                print("Timed out sending the last predictions")
+        for task in pending:
+            task.cancel()
+        await models.release(model)
+        await websocket.close(code=close_code, reason=close_reason)
 
 
 @app.get("/v1/labels")
-async def get_labels():
-    raw_labels = manifest.get("labels")
-    if not raw_labels:
+async def get_labels(model: str = MODEL_NAME, version: str = MODEL_VERSION):
+    if not startup.ready.is_set():
+        raise HTTPException(status_code=503, detail="Model is loading")
+    if not is_served(model, version):
+        raise HTTPException(status_code=404, detail="Unknown model")
+
+    # Labels are in the manifest, so a model that isn't loaded isn't loaded
+    # just to answer this.
+    loaded = models.get(model, version)
+    if loaded is not None:
+        manifest = loaded.manifest
+    else:
+        try:
+            manifest = await asyncio.to_thread(
+                get_manifest, REGISTRY_URL, model, version
+            )
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                raise HTTPException(status_code=404, detail="Unknown model")
+            raise HTTPException(status_code=502, detail="Registry error")
+        except requests.RequestException:
+            raise HTTPException(status_code=502, detail="Registry unavailable")
+
+    sorted_labels = manifest_labels(manifest)
+
+    if not sorted_labels:
         raise HTTPException(status_code=404, detail="Labels not found in manifest")
 
-    sorted_labels = [
-        label for label, _ in sorted(raw_labels.items(), key=lambda x: x[1])
-    ]
-
     return {
-        "model": manifest["model"]["name"],
-        "version": manifest["model"]["version"],
+        "model": model,
+        "version": version,
         "labels": sorted_labels,
     }
+
+
+@app.get("/v1/models")
+async def get_models():
+    return models.status()
+
+
+async def classify_stream(
+    model: LoadedModel,
+    uploads: list,
+    segment: bool,
+    release: Callable[[], Awaitable[None]],
+):
+    loop = asyncio.get_running_loop()
+    out: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def classify_file(filename: str, data: bytes):
+        try:
+            audio, segments = await loop.run_in_executor(
+                decode_executor,
+                decode_and_segment,
+                data,
+                SAMPLE_RATE,
+                MIN_UTTERANCE_LEN,
+                CLASSIFY_MAX_SEGMENT_S,
+                segment,
+            )
+
+            async def labelled(segment_info, future):
+                return segment_info, await future
+
+            # The scheduler batches these with every other file and session.
+            pending = []
+            for index, (start, end) in enumerate(segments):
+                future = await model.scheduler.enqueue(audio[start:end])
+                pending.append(labelled((index, start, end), future))
+
+            for next_done in asyncio.as_completed(pending):
+                (index, start, end), results = await next_done
+                await out.put(
+                    {
+                        "type": "segment",
+                        "file": filename,
+                        "index": index,
+                        "start": start / SAMPLE_RATE,
+                        "end": end / SAMPLE_RATE,
+                        "predictions": to_predictions(results, model.labels),
+                    }
+                )
+
+            await out.put(
+                {
+                    "type": "file",
+                    "file": filename,
+                    "duration": audio.shape[0] / SAMPLE_RATE,
+                    "segments": len(segments),
+                }
+            )
+        except Exception as e:
+            await out.put({"type": "error", "file": filename, "detail": str(e)})
+        finally:
+            await out.put(done)
+
+    tasks = [asyncio.create_task(classify_file(*upload)) for upload in uploads]
+    remaining = len(tasks)
+
+    try:
+        while remaining:
+            item = await out.get()
+            if item is done:
+                remaining -= 1
+                continue
+            yield json.dumps(item) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+        await release()
+
+
+@app.post("/v1/classify")
+async def classify(
+    files: list[UploadFile] = File(...),
+    model: str = MODEL_NAME,
+    version: str = MODEL_VERSION,
+    segment: bool = True,
+):
+    if not startup.ready.is_set():
+        raise HTTPException(status_code=503, detail="Model is loading")
+    if not is_served(model, version):
+        raise HTTPException(status_code=404, detail="Unknown model")
+
+    uploads = [(f.filename, await f.read()) for f in files]
+
+    try:
+        loaded = await models.acquire(model, version)
+    except ModelCacheFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    # The generator's finally never runs if the body is never started, e.g.
+    # when the client goes away first; the background task covers that.
+    released = False
+
+    async def release():
+        nonlocal released
+        if not released:
+            released = True
+            await models.release(loaded)
+
+    return StreamingResponse(
+        classify_stream(loaded, uploads, segment, release),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(release),
+    )
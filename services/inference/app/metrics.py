@@ -0,0 +1,135 @@
+import asyncio
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# With INFER_EXECUTOR=process, set PROMETHEUS_MULTIPROC_DIR so the loader
+# stages timed inside worker processes are exported too.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# From sub-millisecond buffer work up to multi-second inference batches.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+STAGE_SECONDS = Histogram(
+    "tone_stage_seconds",
+    "Time spent in each stage of the streaming pipeline",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# Bound once so the hot path skips the label lookup.
+STAGES = {
+    stage: STAGE_SECONDS.labels(stage)
+    for stage in (
+        "decode",
+        "vad",
+        "buffer",
+        "enqueue",
+        "queue_wait",
+        "features",
+        "session_run",
+        "postprocess",
+        "end_to_end",
+    )
+}
+
+ACTIVE_SESSIONS = Gauge(
+    "tone_active_sessions",
+    "Open /v1/ws sessions",
+    multiprocess_mode="livesum",
+)
+
+REJECTED_SESSIONS = Counter(
+    "tone_rejected_sessions",
+    "/v1/ws sessions refused before streaming, by reason",
+    ["reason"],
+)
+
+SHED_PREDICTIONS = Counter(
+    "tone_shed_predictions",
+    "Partial predictions dropped instead of queued or sent",
+    ["reason"],
+)
+
+SLOW_DOWN = Counter(
+    "tone_slow_down",
+    "Times a session was paused for having too many inferences in flight",
+)
+
+TRUNCATED_UTTERANCES = Counter(
+    "tone_truncated_utterances",
+    "Utterances cut at the per-session buffer limit",
+)
+
+UTTERANCE_SECONDS = Histogram(
+    "tone_utterance_seconds",
+    "Length of utterances sent for inference",
+    buckets=(0.5, 1, 2, 3, 5, 10, 20, 30, 60),
+)
+
+QUEUE_DEPTH = Gauge(
+    "tone_infer_queue_depth",
+    "Waveforms waiting for an inference batch",
+    ["model", "version"],
+    multiprocess_mode="livesum",
+)
+
+BATCH_SIZE = Histogram(
+    "tone_infer_batch_size",
+    "Waveforms per inference batch",
+    ["model", "version"],
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+MODEL_LOAD_SECONDS = Gauge(
+    "tone_model_load_seconds",
+    "Time taken by each phase of the last model load",
+    ["model", "version", "phase"],
+    multiprocess_mode="max",
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "tone_event_loop_lag_seconds",
+    "How late the event loop wakes up a sleeping task",
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def render() -> tuple[bytes, str]:
+    registry = REGISTRY
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+async def monitor_event_loop(interval: float = 0.25) -> None:
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - start - interval))
@@ -1,12 +1,35 @@
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import numpy as np
 
+from .windowing import infer_windowed_batch
+
 
 class BaseModelLoader:
+    @classmethod
+    def from_manifest(cls, manifest) -> "BaseModelLoader":
+        return cls()
+
     def load(self, model_dir: Path) -> None:
         raise NotImplementedError()
 
     def infer(self, waveform: np.ndarray, sample_rate: int) -> Dict[str, Any]:
         raise NotImplementedError()
+
+    def infer_batch(
+        self, waveforms: List[np.ndarray], sample_rate: int
+    ) -> List[Dict[str, Any]]:
+        return [self.infer(waveform, sample_rate) for waveform in waveforms]
+
+    def infer_windowed(
+        self,
+        waveform: np.ndarray,
+        sample_rate: int,
+        window: int,
+        hop: int,
+        strategy: str = "mean",
+    ) -> Dict[str, Any]:
+        return infer_windowed_batch(
+            self.infer_batch, [waveform], sample_rate, window, hop, strategy
+        )[0]
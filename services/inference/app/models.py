@@ -0,0 +1,159 @@
+import asyncio
+import os
+import resource
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from .scheduler import InferenceScheduler
+
+ModelKey = tuple[str, str]
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak rather than current RSS, but close enough off Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def manifest_labels(manifest: dict) -> list[str]:
+    raw_labels = manifest.get("labels") or {}
+    return [label for label, _ in sorted(raw_labels.items(), key=lambda x: x[1])]
+
+
+@dataclass
+class LoadedModel:
+    name: str
+    version: str
+    manifest: dict
+    executor: Executor
+    scheduler: InferenceScheduler
+    resident_bytes: int
+    timings: dict[str, float] = field(default_factory=dict)
+    leases: int = 0
+    last_used: float = field(default_factory=time.time)
+
+    @property
+    def labels(self) -> list[str]:
+        return manifest_labels(self.manifest)
+
+    async def close(self) -> None:
+        await self.scheduler.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "format": self.manifest["model"]["format"],
+            "resident_mb": self.resident_bytes / 2**20,
+            "sessions": self.leases,
+            "last_used": self.last_used,
+            "load_timings": self.timings,
+        }
+
+
+class ModelCacheFull(RuntimeError):
+    pass
+
+
+class ModelCache:
+    def __init__(
+        self,
+        load: Callable[[str, str], Awaitable[LoadedModel]],
+        budget_bytes: int = 0,
+    ):
+        self.load = load
+        self.budget_bytes = budget_bytes
+
+        self._models: OrderedDict[ModelKey, LoadedModel] = OrderedDict()
+        # Loads are serialized so RSS deltas are attributable and two large
+        # models never spike memory at the same time.
+        self._load_lock = asyncio.Lock()
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(m.resident_bytes for m in self._models.values())
+
+    def get(self, name: str, version: str) -> LoadedModel | None:
+        return self._models.get((name, version))
+
+    async def acquire(self, name: str, version: str) -> LoadedModel:
+        key = (name, version)
+
+        model = self._models.get(key)
+        if model is None:
+            async with self._load_lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = await self.load(name, version)
+                    self._models[key] = model
+
+        model.leases += 1
+        model.last_used = time.time()
+        self._models.move_to_end(key)
+
+        # The actual footprint can differ from the manifest's estimate.
+        await self._evict()
+
+        return model
+
+    async def release(self, model: LoadedModel) -> None:
+        model.leases -= 1
+        model.last_used = time.time()
+        await self._evict()
+
+    @asynccontextmanager
+    async def lease(self, name: str, version: str):
+        model = await self.acquire(name, version)
+        try:
+            yield model
+        finally:
+            await self.release(model)
+
+    async def reserve(self, size_bytes: int) -> None:
+        # Make room for a model about to be loaded; models with live sessions
+        # are never evicted.
+        if not self.budget_bytes:
+            return
+
+        await self._evict(size_bytes)
+        if self._models and self.resident_bytes + size_bytes > self.budget_bytes:
+            raise ModelCacheFull(
+                f"No room for {size_bytes / 2**20:.0f} MB within the "
+                f"{self.budget_bytes / 2**20:.0f} MB model budget"
+            )
+
+    async def _evict(self, extra_bytes: int = 0) -> None:
+        if not self.budget_bytes:
+            return
+
+        for key, model in list(self._models.items()):
+            if self.resident_bytes + extra_bytes <= self.budget_bytes:
+                break
+            if model.leases > 0:
+                continue
+
+            del self._models[key]
+            print(
+                f"Evicting {key[0]} v{key[1]} ({model.resident_bytes / 2**20:.0f} MB)"
+            )
+            await model.close()
+
+    async def close(self) -> None:
+        for model in self._models.values():
+            await model.close()
+        self._models.clear()
+
+    def status(self) -> dict:
+        return {
+            "budget_mb": self.budget_bytes / 2**20,
+            "resident_mb": self.resident_bytes / 2**20,
+            "models": [m.status() for m in reversed(self._models.values())],
+        }
@@ -0,0 +1,66 @@
+import io
+import threading
+
+import numpy as np
+import soundfile as sf
+import torch
+import torchaudio.functional as AF
+from silero_vad import get_speech_timestamps, load_silero_vad
+
+_local = threading.local()
+
+
+def _vad_model():
+    # Silero's wrapper keeps recurrent state, so each decode thread gets its
+    # own copy.
+    if not hasattr(_local, "vad"):
+        _local.vad = load_silero_vad(onnx=True)
+    return _local.vad
+
+
+def decode_audio(data: bytes, sample_rate: int) -> np.ndarray:
+    audio, sr = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)
+
+    if sr != sample_rate:
+        audio = AF.resample(torch.from_numpy(audio), sr, sample_rate).numpy()
+
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def speech_segments(
+    audio: np.ndarray, sample_rate: int, min_samples: int, max_segment_s: float
+) -> list[tuple[int, int]]:
+    # Long stretches of speech are split so no segment outgrows a batch.
+    timestamps = get_speech_timestamps(
+        torch.from_numpy(audio),
+        _vad_model(),
+        sampling_rate=sample_rate,
+        min_speech_duration_ms=int(min_samples * 1000 / sample_rate),
+        max_speech_duration_s=max_segment_s,
+    )
+    return [(t["start"], t["end"]) for t in timestamps]
+
+
+def decode_and_segment(
+    data: bytes,
+    sample_rate: int,
+    min_samples: int,
+    max_segment_s: float,
+    segment: bool = True,
+) -> tuple[np.ndarray, list[tuple[int, int]]]:
+    audio = decode_audio(data, sample_rate)
+
+    # Empty or very short rows would share a model batch with other requests
+    # and break its normalization.
+    if not segment:
+        if audio.shape[0] < min_samples:
+            raise ValueError(
+                f"Audio is shorter than the {min_samples / sample_rate:g} s minimum"
+            )
+        return audio, [(0, audio.shape[0])]
+
+    segments = speech_segments(audio, sample_rate, min_samples, max_segment_s)
+    return audio, [
+        (start, end) for start, end in segments if end - start >= min_samples
+    ]
@@ -1,5 +1,5 @@
 from .model import BaseModelLoader
-from .wavlm import WavLMOnnxLoader, WavLMTorchLoader
+from .wavlm import WavLMOnnxInt8Loader, WavLMOnnxLoader, WavLMTorchLoader
 
 MODEL_REGISTRY: dict[str, dict[str, dict[str, type[BaseModelLoader]]]] = {
     "tone": {
@@ -13,7 +13,22 @@ MODEL_REGISTRY: dict[str, dict[str, dict[str, type[BaseModelLoader]]]] = {
         "1.0.2": {
             "onnx": WavLMOnnxLoader,
         },
-    }
+        # INT8 builds are their own versions (model/quantize.py --manifest),
+        # so they never replace the fp32 manifest or share its cache.
+        "1.0.2-int8": {
+            "onnx-int8": WavLMOnnxInt8Loader,
+        },
+    },
+    # Distilled from tone (model/train.py --distill) for low-latency CPU
+    # serving; pick per deployment with MODEL_NAME.
+    "tone-student": {
+        "1.0.0": {
+            "onnx": WavLMOnnxLoader,
+        },
+        "1.0.0-int8": {
+            "onnx-int8": WavLMOnnxInt8Loader,
+        },
+    },
 }
 
 
@@ -28,4 +43,4 @@ def get_model_loader(
     except KeyError:
         raise ValueError(f"No loader for {name} v{version} ({format})")
 
-    return loader_cls()
+    return loader_cls.from_manifest(manifest)
@@ -0,0 +1,173 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from functools import partial
+from typing import Callable
+
+import numpy as np
+
+from .metrics import BATCH_SIZE, QUEUE_DEPTH, STAGES
+from .windowing import AGGREGATIONS, infer_windowed_batch
+
+InferBatchFn = Callable[[list[np.ndarray], int], list[dict]]
+
+
+class InferenceScheduler:
+    def __init__(
+        self,
+        infer_batch: InferBatchFn,
+        sample_rate: int,
+        executor: Executor | None = None,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_queue_size: int = 64,
+        max_concurrency: int = 1,
+        window: int | None = None,
+        hop: int | None = None,
+        aggregate: str = "mean",
+        model_key: tuple[str, str] = ("", ""),
+    ):
+        if aggregate not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation: {aggregate}")
+
+        self.infer_batch = infer_batch
+        self.sample_rate = sample_rate
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.max_concurrency = max_concurrency
+        self.window = window
+        self.hop = hop or window
+        self.aggregate = aggregate
+        self.model_key = model_key
+        self._queue_depth = QUEUE_DEPTH.labels(*model_key)
+        self._batch_size = BATCH_SIZE.labels(*model_key)
+
+        # A partial of module-level functions so it still pickles when the
+        # executor is a process pool.
+        self._infer = infer_batch
+        if window is not None:
+            self._infer = partial(
+                infer_windowed_batch,
+                infer_batch,
+                window=window,
+                hop=self.hop,
+                strategy=aggregate,
+                max_batch_size=max_batch_size,
+            )
+
+        self._queue: asyncio.Queue | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._task: asyncio.Task | None = None
+        self._inflight: set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Scheduler stopped"))
+
+        try:
+            QUEUE_DEPTH.remove(*self.model_key)
+            BATCH_SIZE.remove(*self.model_key)
+        except KeyError:
+            pass
+
+    async def enqueue(self, waveform: np.ndarray) -> asyncio.Future:
+        # Waits for queue space, so a saturated pool pushes back on the caller
+        # instead of letting utterances pile up in memory.
+        if self._queue is None:
+            raise RuntimeError("Scheduler not started")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((waveform, future, time.perf_counter()))
+        self._queue_depth.set(self._queue.qsize())
+
+        return future
+
+    async def submit(self, waveform: np.ndarray) -> dict:
+        return await (await self.enqueue(waveform))
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        self._queue_depth.set(self._queue.qsize())
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            # Waiting for a free worker before collecting lets the queue fill
+            # up, so batches grow under load instead of queueing behind one
+            # another.
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _run_batch(self, batch: list) -> None:
+        try:
+            # Sessions that went away while queued don't need a slot in the
+            # batch.
+            batch = [(w, f, t) for w, f, t in batch if not f.done()]
+            if not batch:
+                return
+
+            dispatched = time.perf_counter()
+            for _, _, queued in batch:
+                STAGES["queue_wait"].observe(dispatched - queued)
+            self._batch_size.observe(len(batch))
+
+            loop = asyncio.get_running_loop()
+            try:
+                results = await loop.run_in_executor(
+                    self.executor,
+                    self._infer,
+                    [w for w, _, _ in batch],
+                    self.sample_rate,
+                )
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
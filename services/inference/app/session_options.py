@@ -0,0 +1,108 @@
+import os
+from pathlib import Path
+
+import onnxruntime as ort
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+DEFAULTS = {
+    "intra_op_num_threads": 0,
+    "inter_op_num_threads": 0,
+    "graph_optimization_level": "all",
+    "execution_mode": "sequential",
+    "enable_cpu_mem_arena": True,
+    "enable_mem_pattern": True,
+    "cache_optimized_model": True,
+}
+
+
+def _bool(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+ENV_OVERRIDES = {
+    "intra_op_num_threads": ("ORT_INTRA_OP_THREADS", int),
+    "inter_op_num_threads": ("ORT_INTER_OP_THREADS", int),
+    "graph_optimization_level": ("ORT_GRAPH_OPTIMIZATION_LEVEL", str),
+    "execution_mode": ("ORT_EXECUTION_MODE", str),
+    "enable_cpu_mem_arena": ("ORT_ENABLE_CPU_MEM_ARENA", _bool),
+    "enable_mem_pattern": ("ORT_ENABLE_MEM_PATTERN", _bool),
+    "cache_optimized_model": ("ORT_CACHE_OPTIMIZED_MODEL", _bool),
+}
+
+
+def resolve_session_config(manifest) -> dict:
+    # Defaults, then the manifest's runtime.onnx section, then the
+    # environment, so a deployment can pin threads without a new manifest.
+    config = dict(DEFAULTS)
+    config.update(manifest.get("runtime", {}).get("onnx", {}))
+
+    for key, (env, parse) in ENV_OVERRIDES.items():
+        value = os.getenv(env)
+        if value is not None:
+            config[key] = parse(value)
+
+    unknown = set(config) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown ONNX runtime options: {sorted(unknown)}")
+    if config["graph_optimization_level"] not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(
+            f"Unknown graph optimization level: {config['graph_optimization_level']}"
+        )
+    if config["execution_mode"] not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode: {config['execution_mode']}")
+
+    return config
+
+
+def build_session_options(config: dict) -> ort.SessionOptions:
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = config["intra_op_num_threads"]
+    options.inter_op_num_threads = config["inter_op_num_threads"]
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[
+        config["graph_optimization_level"]
+    ]
+    options.execution_mode = EXECUTION_MODES[config["execution_mode"]]
+    options.enable_cpu_mem_arena = config["enable_cpu_mem_arena"]
+    options.enable_mem_pattern = config["enable_mem_pattern"]
+    return options
+
+
+def optimized_model_path(model_path: Path, level: str) -> Path:
+    # Optimized graphs are specific to the ORT build that produced them.
+    return model_path.with_name(
+        f"{model_path.stem}.ort-{ort.__version__}.{level}{model_path.suffix}"
+    )
+
+
+def create_session(model_path: Path, config: dict) -> ort.InferenceSession:
+    options = build_session_options(config)
+    providers = ["CPUExecutionProvider"]
+    level = config["graph_optimization_level"]
+
+    if not config["cache_optimized_model"] or level == "disable":
+        return ort.InferenceSession(str(model_path), options, providers=providers)
+
+    cached = optimized_model_path(model_path, level)
+    if cached.exists():
+        options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS["disable"]
+        return ort.InferenceSession(str(cached), options, providers=providers)
+
+    # Serialize to a private file and rename it into place, so workers that
+    # start together never read a half-written graph.
+    tmp = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+    options.optimized_model_filepath = str(tmp)
+    session = ort.InferenceSession(str(model_path), options, providers=providers)
+    os.replace(tmp, cached)
+
+    return session
@@ -0,0 +1,40 @@
+import asyncio
+import time
+from contextlib import contextmanager
+
+
+class Startup:
+    def __init__(self):
+        self.phase = "starting"
+        self.timings: dict[str, float] = {}
+        self.error: str | None = None
+        self.attempts = 0
+        self.ready = asyncio.Event()
+
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def track(self, phase: str):
+        self.phase = phase
+        start = time.perf_counter()
+        yield
+        self.timings[phase] = time.perf_counter() - start
+
+    def fail(self, error: Exception) -> None:
+        self.attempts += 1
+        self.error = f"{self.phase}: {error}"
+
+    def mark_ready(self) -> None:
+        self.phase = "ready"
+        self.error = None
+        self.timings["total"] = time.perf_counter() - self._started
+        self.ready.set()
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready.is_set(),
+            "phase": self.phase,
+            "timings": self.timings,
+            "error": self.error,
+            "failed_attempts": self.attempts,
+        }
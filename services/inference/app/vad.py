@@ -0,0 +1,216 @@
+import asyncio
+from itertools import islice
+
+import numpy as np
+import onnxruntime as ort
+
+from .buffer import AudioBuffer
+
+STATE_SHAPE = (2, 128)
+
+
+class VADStream:
+    # Per-session recurrent state plus the VADIterator trigger logic, so the
+    # start/end events match silero's VADIterator chunk for chunk.
+    def __init__(
+        self,
+        chunk_size: int,
+        context_size: int,
+        sample_rate: int,
+        threshold: float = 0.5,
+        min_silence_duration_ms: int = 100,
+        speech_pad_ms: int = 30,
+        max_pending: int | None = None,
+    ):
+        self.chunk_size = chunk_size
+        self.threshold = threshold
+        self.min_silence_samples = sample_rate * min_silence_duration_ms / 1000
+        self.speech_pad_samples = sample_rate * speech_pad_ms / 1000
+
+        self.state = np.zeros(STATE_SHAPE, dtype=np.float32)
+        self.context = np.zeros(context_size, dtype=np.float32)
+        # Appending past max_pending raises OverflowError.
+        self.pending = AudioBuffer(chunk_size * 16, max_capacity=max_pending)
+
+        self.triggered = False
+        self.temp_end = 0
+        self.current_sample = 0
+
+    def update(self, speech_prob: float) -> dict | None:
+        window = self.chunk_size
+        self.current_sample += window
+
+        if speech_prob >= self.threshold and self.temp_end:
+            self.temp_end = 0
+
+        if speech_prob >= self.threshold and not self.triggered:
+            self.triggered = True
+            speech_start = max(
+                0, self.current_sample - self.speech_pad_samples - window
+            )
+            return {"start": int(speech_start)}
+
+        if speech_prob < self.threshold - 0.15 and self.triggered:
+            if not self.temp_end:
+                self.temp_end = self.current_sample
+            if self.current_sample - self.temp_end < self.min_silence_samples:
+                return None
+
+            speech_end = self.temp_end + self.speech_pad_samples - window
+            self.temp_end = 0
+            self.triggered = False
+            return {"end": int(speech_end)}
+
+        return None
+
+
+class BatchedVAD:
+    def __init__(
+        self,
+        session: ort.InferenceSession,
+        sample_rate: int = 16000,
+        chunk_size: int = 512,
+        max_batch_size: int = 512,
+        max_chunks_per_tick: int = 32,
+        tick_ms: float = 10.0,
+        **stream_kwargs,
+    ):
+        if sample_rate not in (8000, 16000):
+            raise ValueError("Silero VAD supports 8000 and 16000 Hz only")
+
+        self.session = session
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.context_size = 64 if sample_rate == 16000 else 32
+        self.max_batch_size = max_batch_size
+        self.max_chunks_per_tick = max_chunks_per_tick
+        self.tick = tick_ms / 1000
+        self.stream_kwargs = stream_kwargs
+
+        self._sr = np.array(sample_rate, dtype=np.int64)
+        self._waiting: dict[VADStream, asyncio.Future] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for future in self._waiting.values():
+            if not future.done():
+                future.set_exception(RuntimeError("VAD stopped"))
+        self._waiting.clear()
+
+    def open(self, max_pending: int | None = None) -> VADStream:
+        return VADStream(
+            self.chunk_size,
+            self.context_size,
+            self.sample_rate,
+            max_pending=max_pending,
+            **self.stream_kwargs,
+        )
+
+    # Returns (chunk, event) for every full chunk now buffered in `stream`,
+    # after appending `samples` if given (decoders may also write straight into
+    # `stream.pending`). The chunk views are valid until the next write.
+    async def process(
+        self, stream: VADStream, samples: np.ndarray | None = None
+    ) -> list[tuple[np.ndarray, dict | None]]:
+        if self._wakeup is None:
+            raise RuntimeError("VAD not started")
+
+        if samples is not None:
+            stream.pending.append(samples)
+
+        # A large backlog is spread over several ticks so it never holds up
+        # the other sessions' chunks.
+        results = []
+        while len(stream.pending) >= self.chunk_size:
+            future = asyncio.get_running_loop().create_future()
+            self._waiting[stream] = future
+            self._wakeup.set()
+            results += await future
+
+        return results
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await self._wakeup.wait()
+            # One tick: let other sessions' frames land before the forward pass.
+            await asyncio.sleep(self.tick)
+            self._wakeup.clear()
+
+            waiting = {s: f for s, f in self._waiting.items() if not f.done()}
+            self._waiting.clear()
+            if not waiting:
+                continue
+
+            try:
+                results = await loop.run_in_executor(None, self._evaluate, waiting)
+            except Exception as e:
+                for future in waiting.values():
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for stream, future in waiting.items():
+                if not future.done():
+                    future.set_result(results[stream])
+
+    def _evaluate(self, waiting: dict) -> dict:
+        results = {stream: [] for stream in waiting}
+        chunk_iters = {
+            s: islice(s.pending.chunks(self.chunk_size), self.max_chunks_per_tick)
+            for s in waiting
+        }
+
+        # Sessions that sent several chunks since the last tick take one row
+        # per round, which keeps each session's recurrent state in order.
+        while chunk_iters:
+            batch = []
+            for stream, chunks in list(chunk_iters.items()):
+                chunk = next(chunks, None)
+                if chunk is None:
+                    del chunk_iters[stream]
+                    continue
+                batch.append((stream, chunk))
+
+            for start in range(0, len(batch), self.max_batch_size):
+                rows = batch[start : start + self.max_batch_size]
+                probs = self._forward(rows)
+
+                for (stream, chunk), prob in zip(rows, probs):
+                    results[stream].append((chunk, stream.update(float(prob))))
+
+        return results
+
+    def _forward(self, rows: list) -> np.ndarray:
+        n = len(rows)
+        x = np.empty((n, self.context_size + self.chunk_size), dtype=np.float32)
+        state = np.empty((STATE_SHAPE[0], n, STATE_SHAPE[1]), dtype=np.float32)
+
+        for i, (stream, chunk) in enumerate(rows):
+            x[i, : self.context_size] = stream.context
+            x[i, self.context_size :] = chunk
+            state[:, i] = stream.state
+
+        out, new_state = self.session.run(
+            None, {"input": x, "state": state, "sr": self._sr}
+        )
+
+        for i, (stream, _) in enumerate(rows):
+            stream.state[:] = new_state[:, i]
+            stream.context[:] = x[i, -self.context_size :]
+
+        return out[:, 0]
@@ -4,97 +4,109 @@ from pathlib import Path
 import numpy as np
 import onnxruntime as ort
 import torch
-from transformers import AutoFeatureExtractor, WavLMForSequenceClassification
 
+from .features import FeatureConfig, prepare_batch
+from .metrics import STAGES
 from .model import BaseModelLoader
+from .session_options import create_session, resolve_session_config
+
+
+def _result(logits: np.ndarray) -> dict:
+    return {
+        "prediction": int(np.argmax(logits)),
+        "scores": logits.tolist(),
+    }
 
 
 class WavLMTorchLoader(BaseModelLoader):
     def __init__(self, device: str = "cpu"):
         self.device = torch.device(device)
-        self.model: WavLMForSequenceClassification | None = None
-        self.feature_extractor: AutoFeatureExtractor | None = None
+        self.model = None
+        self.features: FeatureConfig | None = None
 
     def load(self, model_dir: Path) -> None:
+        # Only the Torch path needs transformers; ONNX serving never imports it.
+        from transformers import WavLMForSequenceClassification
+
         self.model = WavLMForSequenceClassification.from_pretrained(model_dir)
-        self.feature_extractor = AutoFeatureExtractor.from_pretrained(model_dir)
+        self.features = FeatureConfig.from_pretrained(model_dir)
 
         self.model.to(self.device)
         self.model.eval()
 
     def infer(self, waveform: np.ndarray, sample_rate: int) -> dict:
-        if self.model is None or self.feature_extractor is None:
-            raise RuntimeError("Model not loaded")
+        return self.infer_batch([waveform], sample_rate)[0]
 
-        inputs = self.feature_extractor(
-            waveform,
-            sampling_rate=sample_rate,
-            return_tensors="pt",
-        )
+    def infer_batch(self, waveforms: list[np.ndarray], sample_rate: int) -> list[dict]:
+        if self.model is None or self.features is None:
+            raise RuntimeError("Model not loaded")
 
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        with STAGES["features"].time():
+            input_values, attention_mask = prepare_batch(
+                waveforms, sample_rate, self.features
+            )
 
-        with torch.inference_mode():
-            logits = self.model(**inputs).logits
+        with STAGES["session_run"].time(), torch.inference_mode():
+            logits = self.model(
+                input_values=torch.from_numpy(input_values).to(self.device),
+                attention_mask=torch.from_numpy(attention_mask).to(self.device),
+            ).logits
 
-        logits_np = logits.squeeze(0).cpu().numpy()
-        pred = int(np.argmax(logits_np))
+        logits_np = logits.cpu().numpy()
 
-        return {
-            "prediction": pred,
-            "scores": logits_np.tolist(),
-        }
+        return [_result(row) for row in logits_np]
 
 
 class WavLMOnnxLoader(BaseModelLoader):
-    def __init__(self):
+    model_file = "model.onnx"
+
+    def __init__(self, session_config: dict | None = None):
+        self.session_config = session_config or resolve_session_config({})
         self.session: ort.InferenceSession | None = None
-        self.feature_extractor: AutoFeatureExtractor | None = None
+        self.features: FeatureConfig | None = None
+        self.input_names: set[str] = set()
+
+    @classmethod
+    def from_manifest(cls, manifest) -> "WavLMOnnxLoader":
+        return cls(resolve_session_config(manifest))
 
     def load(self, model_dir: Path) -> None:
-        self.session = ort.InferenceSession(
-            str(model_dir / "model.onnx"),
-            providers=["CPUExecutionProvider"],
-        )
+        self.session = create_session(model_dir / self.model_file, self.session_config)
+        self.input_names = {i.name for i in self.session.get_inputs()}
 
-        self.feature_extractor = AutoFeatureExtractor.from_pretrained(model_dir)
+        self.features = FeatureConfig.from_pretrained(model_dir)
 
         dummy_waveform = np.zeros((16000,), dtype=np.float32)
-        dummy_inputs = self.feature_extractor(
-            dummy_waveform, sampling_rate=16000, return_tensors="np"
-        )
-
-        ort_inputs = {}
-        for k, v in dummy_inputs.items():
-            if np.issubdtype(v.dtype, np.integer):
-                ort_inputs[k] = v.astype(np.int64)
-            else:
-                ort_inputs[k] = v
-
-        _ = self.session.run(None, ort_inputs)
+        self.infer(dummy_waveform, 16000)
 
     def infer(self, waveform: np.ndarray, sample_rate: int) -> dict:
-        if self.session is None or self.feature_extractor is None:
+        return self.infer_batch([waveform], sample_rate)[0]
+
+    def infer_batch(self, waveforms: list[np.ndarray], sample_rate: int) -> list[dict]:
+        if self.session is None or self.features is None:
             raise RuntimeError("Model not loaded")
 
-        inputs = self.feature_extractor(
-            waveform,
-            sampling_rate=sample_rate,
-            return_tensors="np",
-        )
+        # Without a mask input, padding would leak into the pooled logits.
+        if (
+            "attention_mask" not in self.input_names
+            and len({len(w) for w in waveforms}) > 1
+        ):
+            return [self.infer_batch([w], sample_rate)[0] for w in waveforms]
+
+        with STAGES["features"].time():
+            input_values, attention_mask = prepare_batch(
+                waveforms, sample_rate, self.features
+            )
+
+        ort_inputs = {"input_values": input_values}
+        if "attention_mask" in self.input_names:
+            ort_inputs["attention_mask"] = attention_mask
 
-        ort_inputs = {}
-        for k, v in inputs.items():
-            if np.issubdtype(v.dtype, np.integer):
-                ort_inputs[k] = v.astype(np.int64)
-            else:
-                ort_inputs[k] = v
+        with STAGES["session_run"].time():
+            logits = self.session.run(None, ort_inputs)[0]
 
-        logits = self.session.run(None, ort_inputs)[0][0]
+        return [_result(row) for row in logits]
 
-        pred = int(np.argmax(logits))
 
-        return {
-            "prediction": pred,
-            "scores": logits.tolist(),
-        }
+class WavLMOnnxInt8Loader(WavLMOnnxLoader):
+    model_file = "model.int8.onnx"
@@ -0,0 +1,80 @@
+from typing import Callable
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+AGGREGATIONS = ("mean", "max_confidence", "energy")
+
+
+def split_windows(waveform: np.ndarray, window: int, hop: int) -> np.ndarray:
+    if waveform.shape[0] <= window:
+        return waveform[None]
+
+    last = waveform.shape[0] - window
+    starts = list(range(0, last + 1, hop))
+    # Align a final window with the end so the tail is never dropped.
+    if starts[-1] != last:
+        starts.append(last)
+
+    return sliding_window_view(waveform, window)[starts]
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    e = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def aggregate_results(results: list[dict], strategy: str = "mean") -> dict:
+    if len(results) == 1:
+        return results[0]
+
+    logits = np.array([r["scores"] for r in results], dtype=np.float32)
+    energy = np.array([r.get("energy", 1.0) for r in results], dtype=np.float32)
+
+    match strategy:
+        case "mean":
+            agg = logits.mean(axis=0)
+        case "max_confidence":
+            agg = logits[np.argmax(_softmax(logits).max(axis=1))]
+        case "energy":
+            weights = energy if energy.sum() > 0 else np.ones_like(energy)
+            agg = weights @ logits / weights.sum()
+        case _:
+            raise ValueError(f"Unknown aggregation: {strategy}")
+
+    return {
+        "prediction": int(np.argmax(agg)),
+        "scores": agg.tolist(),
+        "energy": float(energy.mean()),
+    }
+
+
+def infer_windowed_batch(
+    infer_batch: Callable[[list[np.ndarray], int], list[dict]],
+    waveforms: list[np.ndarray],
+    sample_rate: int,
+    window: int,
+    hop: int,
+    strategy: str = "mean",
+    max_batch_size: int | None = None,
+) -> list[dict]:
+    # Windows from every waveform go through the model in batches of at most
+    # max_batch_size rows, so one long file can't become one huge run, and
+    # are folded back into one result per waveform.
+    groups = [split_windows(w, window, hop) for w in waveforms]
+    rows = [row for group in groups for row in group]
+
+    step = max_batch_size or len(rows)
+    results = []
+    for i in range(0, len(rows), step):
+        results.extend(infer_batch(rows[i : i + step], sample_rate))
+    for row, result in zip(rows, results):
+        result["energy"] = float(np.sqrt(np.mean(np.square(row))))
+
+    out = []
+    offset = 0
+    for group in groups:
+        out.append(aggregate_results(results[offset : offset + len(group)], strategy))
+        offset += len(group)
+
+    return out
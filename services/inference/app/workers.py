@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .model import BaseModelLoader
+from .registry import get_model_loader
+from .scheduler import InferBatchFn
+
+_worker_loader: BaseModelLoader | None = None
+_worker_barrier = None
+
+
+def _init_worker(manifest, model_dir: Path, barrier) -> None:
+    global _worker_loader, _worker_barrier
+    _worker_barrier = barrier
+    _worker_loader = get_model_loader(manifest)
+    _worker_loader.load(model_dir)
+
+
+def _worker_infer_batch(waveforms: list[np.ndarray], sample_rate: int) -> list[dict]:
+    if _worker_loader is None:
+        raise RuntimeError("Worker model not loaded")
+    return _worker_loader.infer_batch(waveforms, sample_rate)
+
+
+def _worker_ready() -> tuple[int, bool]:
+    # Holds this worker until every worker has reached the barrier, so each
+    # call lands on a different process.
+    _worker_barrier.wait()
+    return os.getpid(), _worker_loader is not None
+
+
+def create_executor(
+    kind: str, workers: int, manifest, model_dir: Path
+) -> tuple[Executor, InferBatchFn]:
+    match kind:
+        case "thread":
+            # ONNX Runtime and torch release the GIL while running the graph,
+            # so threads sharing one loaded model scale across cores.
+            loader = get_model_loader(manifest)
+            loader.load(model_dir)
+            executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="infer"
+            )
+            return executor, loader.infer_batch
+        case "process":
+            context = multiprocessing.get_context("spawn")
+            barrier = context.Barrier(workers)
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(manifest, model_dir, barrier),
+            )
+            # Workers load the model in their initializer; wait for all of
+            # them so the service isn't reported ready before it can answer. A
+            # failed load breaks the pool and raises here, into startup retries.
+            try:
+                futures = [executor.submit(_worker_ready) for _ in range(workers)]
+                ready = dict(f.result() for f in futures)
+                if len(ready) != workers or not all(ready.values()):
+                    raise RuntimeError("Inference workers failed to load the model")
+            except BaseException:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            return executor, _worker_infer_batch
+        case _:
+            raise ValueError(f"Unknown executor kind: {kind}")
@@ -0,0 +1,75 @@
+# Per-frame cost of buffering a streamed utterance, old concatenate path vs
+# AudioBuffer. Run from services/inference: python -m bench.bench_buffer
+import argparse
+import time
+
+import numpy as np
+
+from app.buffer import AudioBuffer, RingBuffer
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 512
+FRAME_SIZE = 1600  # 100 ms websocket messages
+PRE_ROLL = 3 * CHUNK_SIZE
+
+
+def run_concatenate(frames: list[np.ndarray]) -> None:
+    audio_buffer = np.array([], dtype=np.float32)
+    vad_buffer = np.array([], dtype=np.float32)
+
+    for frame in frames:
+        vad_buffer = np.concatenate((vad_buffer, frame))
+        while len(vad_buffer) >= CHUNK_SIZE:
+            chunk = vad_buffer[:CHUNK_SIZE]
+            vad_buffer = vad_buffer[CHUNK_SIZE:]
+            audio_buffer = np.concatenate((audio_buffer, chunk))
+
+
+def run_audio_buffer(frames: list[np.ndarray]) -> None:
+    ring_buffer = RingBuffer(PRE_ROLL)
+    audio_buffer = AudioBuffer(SAMPLE_RATE * 4)
+    vad_buffer = AudioBuffer(CHUNK_SIZE * 16)
+
+    for frame in frames:
+        vad_buffer.append(frame)
+        for chunk in vad_buffer.chunks(CHUNK_SIZE):
+            ring_buffer.append(chunk)
+            audio_buffer.append(chunk)
+
+    audio_buffer.detach()
+
+
+def per_frame_us(fn, frames: list[np.ndarray], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(frames)
+        best = min(best, time.perf_counter() - start)
+    return best / len(frames) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--seconds", type=int, nargs="+", default=[1, 5, 15, 30, 60, 120]
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    print(f"{'utterance':>10} {'concatenate':>14} {'AudioBuffer':>14}")
+    for seconds in args.seconds:
+        n_frames = seconds * SAMPLE_RATE // FRAME_SIZE
+        frames = [
+            rng.standard_normal(FRAME_SIZE, dtype=np.float32) for _ in range(n_frames)
+        ]
+
+        concat_us = per_frame_us(run_concatenate, frames, args.repeats)
+        buffer_us = per_frame_us(run_audio_buffer, frames, args.repeats)
+
+        print(f"{seconds:>9}s {concat_us:>11.2f} us {buffer_us:>11.2f} us  (per frame)")
+
+
+if __name__ == "__main__":
+    main()
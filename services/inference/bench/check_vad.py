@@ -0,0 +1,104 @@
+# Checks that BatchedVAD reports the same speech start/end events as silero's
+# VADIterator running one session at a time. Several sessions stream the files
+# at once in uneven frames, so batching, chunk splitting and per-session state
+# are all exercised. Run from services/inference:
+#   python -m bench.check_vad --wav speech/*.wav
+import argparse
+import asyncio
+import sys
+
+import numpy as np
+import soundfile as sf
+import torch
+from silero_vad import VADIterator, load_silero_vad
+
+from app.vad import BatchedVAD
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 512
+
+
+def load_wav(path: str) -> np.ndarray:
+    audio, sr = sf.read(path, dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)
+
+    if sr != SAMPLE_RATE:
+        import torchaudio.functional as AF
+
+        audio = AF.resample(torch.from_numpy(audio), sr, SAMPLE_RATE).numpy()
+
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def reference_events(model, audio: np.ndarray) -> list[tuple[int, dict]]:
+    iterator = VADIterator(model, sampling_rate=SAMPLE_RATE)
+    events = []
+    for i in range(len(audio) // CHUNK_SIZE):
+        chunk = torch.from_numpy(audio[i * CHUNK_SIZE : (i + 1) * CHUNK_SIZE])
+        event = iterator(chunk, return_seconds=False)
+        if event:
+            events.append((i, event))
+    return events
+
+
+async def batched_events(
+    vad: BatchedVAD, audio: np.ndarray, seed: int
+) -> list[tuple[int, dict]]:
+    rng = np.random.default_rng(seed)
+    stream = vad.open()
+    events = []
+    index = 0
+    offset = 0
+
+    # Uneven frames, so chunks straddle messages the way real clients send them.
+    while offset < len(audio):
+        frame = audio[offset : offset + int(rng.integers(100, 4000))]
+        offset += len(frame)
+        for _, event in await vad.process(stream, frame):
+            if event:
+                events.append((index, event))
+            index += 1
+        await asyncio.sleep(0)
+    return events
+
+
+async def run_batched(session, audio: list[np.ndarray], streams: int) -> list:
+    vad = BatchedVAD(session, sample_rate=SAMPLE_RATE, chunk_size=CHUNK_SIZE)
+    vad.start()
+    try:
+        return await asyncio.gather(
+            *(batched_events(vad, audio[i % len(audio)], i) for i in range(streams))
+        )
+    finally:
+        await vad.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wav", nargs="+", required=True, help="speech WAV files")
+    parser.add_argument("--streams", type=int, default=8)
+    args = parser.parse_args()
+
+    audio = [load_wav(path) for path in args.wav]
+    model = load_silero_vad(onnx=True)
+
+    expected = [reference_events(model, a) for a in audio]
+    results = asyncio.run(run_batched(model.session, audio, args.streams))
+
+    mismatches = 0
+    for i, events in enumerate(results):
+        reference = expected[i % len(audio)]
+        if events != reference:
+            mismatches += 1
+            print(f"stream {i} ({args.wav[i % len(audio)]}): events differ")
+            print(f"  VADIterator: {reference}")
+            print(f"  BatchedVAD:  {events}")
+
+    total = sum(len(e) for e in expected)
+    print(f"{args.streams} streams, {total} reference events, {mismatches} mismatched")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# Local stand-ins for the registry and the artifact bucket, so the service can
+# be started and benchmarked without network access.
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from app.loader import sha256_file
+
+LABELS = ["angry", "disgust", "fearful", "happy", "neutral", "sad"]
+
+PREPROCESSOR_CONFIG = {
+    "do_normalize": True,
+    "feature_extractor_type": "Wav2Vec2FeatureExtractor",
+    "feature_size": 1,
+    "padding_side": "right",
+    "padding_value": 0.0,
+    "return_attention_mask": True,
+    "sampling_rate": 16000,
+}
+
+
+def build_tiny_wavlm(out_dir: Path, hidden_size: int = 64, layers: int = 2) -> Path:
+    # A randomly initialized WavLM with the production graph's inputs and
+    # outputs; its predictions are meaningless but its cost scales the same way.
+    import torch
+    from transformers import WavLMConfig, WavLMForSequenceClassification
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    model_path = out_dir / "model.onnx"
+    if model_path.exists():
+        return out_dir
+
+    config = WavLMConfig(
+        hidden_size=hidden_size,
+        num_hidden_layers=layers,
+        num_attention_heads=4,
+        intermediate_size=hidden_size * 4,
+        conv_dim=(hidden_size,) * 7,
+        num_conv_pos_embeddings=16,
+        num_conv_pos_embedding_groups=4,
+        num_labels=len(LABELS),
+    )
+    model = WavLMForSequenceClassification(config).eval()
+
+    class Logits(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_values, attention_mask):
+            return self.model(input_values, attention_mask=attention_mask).logits
+
+    input_values = torch.randn(2, 16000)
+    attention_mask = torch.ones(2, 16000, dtype=torch.int64)
+    torch.onnx.export(
+        Logits(model),
+        (input_values, attention_mask),
+        model_path,
+        input_names=["input_values", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_values": {0: "batch", 1: "samples"},
+            "attention_mask": {0: "batch", 1: "samples"},
+            "logits": {0: "batch"},
+        },
+        opset_version=17,
+    )
+
+    (out_dir / "preprocessor_config.json").write_text(
+        json.dumps(PREPROCESSOR_CONFIG, indent=2)
+    )
+    return out_dir
+
+
+def build_manifest(model_dir: Path, name: str, version: str) -> dict:
+    model_path = model_dir / "model.onnx"
+    extractor_path = model_dir / "preprocessor_config.json"
+    model_sha = sha256_file(model_path)
+
+    return {
+        "schema_version": "1.0",
+        "model": {
+            "name": name,
+            "version": version,
+            "sha256": model_sha,
+            "size_bytes": model_path.stat().st_size,
+            "format": "onnx",
+        },
+        "audio": {"sample_rate": 16000, "channels": 1},
+        "labels": {label: i for i, label in enumerate(LABELS)},
+        "artifacts": {
+            "model": {
+                "url": str(model_path.resolve()),
+                "sha256": model_sha,
+                "type": "file",
+            },
+            "feature_extractor": {
+                "url": str(extractor_path.resolve()),
+                "sha256": sha256_file(extractor_path),
+                "type": "file",
+            },
+        },
+    }
+
+
+class StandInRegistry:
+    # Answers GET /v1/models/<name>?version=<version> like the Go registry.
+    def __init__(self, manifests: list[dict], host: str = "127.0.0.1"):
+        by_key = {(m["model"]["name"], m["model"]["version"]): m for m in manifests}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                name = url.path.removeprefix("/v1/models/")
+                version = parse_qs(url.query).get("version", [""])[0]
+                manifest = by_key.get((name, version))
+
+                if manifest is None:
+                    self.send_error(404, "model not found")
+                    return
+
+                body = json.dumps(manifest).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, 0), Handler)
+        self.url = f"http://{host}:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "StandInRegistry":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,359 @@
+# End-to-end load test for /v1/ws. Starts the service against a stand-in
+# registry and local artifacts, streams WAV files from N concurrent clients
+# and reports utterance-end-to-prediction latency, throughput, CPU and RSS.
+#
+# Needs the service's dependencies plus bench/requirements.txt (the tiny model
+# fixture is exported with torch and transformers). Run from services/inference:
+#   pip install -r bench/requirements.txt
+#   python -m bench.ws_load --wav speech/*.wav --clients 16 --out run.json
+#   python -m bench.ws_load --wav speech/*.wav --compare run.json
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import requests
+import soundfile as sf
+import websockets
+
+from .fixtures import StandInRegistry, build_manifest, build_tiny_wavlm
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 1600  # 100 ms messages
+TRAILING_SILENCE_S = 1.0
+MODEL_NAME = "tone"
+MODEL_VERSION = "1.0.2"
+
+
+def load_wav(path: str) -> np.ndarray:
+    audio, sr = sf.read(path, dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)
+
+    if sr != SAMPLE_RATE:
+        import torch
+        import torchaudio.functional as AF
+
+        audio = AF.resample(torch.from_numpy(audio), sr, SAMPLE_RATE).numpy()
+
+    # Trailing silence lets the VAD close the utterance before the next file.
+    silence = np.zeros(int(TRAILING_SILENCE_S * SAMPLE_RATE), dtype=np.float32)
+    return np.concatenate([audio.astype(np.float32), silence])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ProcessSampler:
+    # Samples CPU time and RSS of a process and its children from /proc.
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.cpu_percent: list[float] = []
+        self.rss_bytes: list[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._ticks = os.sysconf("SC_CLK_TCK")
+        self._page = os.sysconf("SC_PAGE_SIZE")
+
+    def _pids(self) -> list[int]:
+        try:
+            children = Path(f"/proc/{self.pid}/task/{self.pid}/children").read_text()
+        except OSError:
+            children = ""
+        return [self.pid, *map(int, children.split())]
+
+    def _read(self) -> tuple[float, int]:
+        cpu = 0.0
+        rss = 0
+        for pid in self._pids():
+            try:
+                stat = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+                statm = Path(f"/proc/{pid}/statm").read_text().split()
+            except OSError:
+                continue
+            cpu += (int(stat[11]) + int(stat[12])) / self._ticks
+            rss += int(statm[1]) * self._page
+        return cpu, rss
+
+    def _run(self) -> None:
+        last_cpu, _ = self._read()
+        last_time = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            cpu, rss = self._read()
+            now = time.perf_counter()
+            self.cpu_percent.append((cpu - last_cpu) / (now - last_time) * 100)
+            self.rss_bytes.append(rss)
+            last_cpu, last_time = cpu, now
+
+    def __enter__(self) -> "ProcessSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self) -> dict:
+        cpu = np.array(self.cpu_percent or [0.0])
+        rss = np.array(self.rss_bytes or [0]) / 2**20
+        return {
+            "cpu_percent_mean": float(cpu.mean()),
+            "cpu_percent_max": float(cpu.max()),
+            "rss_mb_mean": float(rss.mean()),
+            "rss_mb_peak": float(rss.max()),
+        }
+
+
+class Service:
+    def __init__(self, registry_url: str, cache_dir: Path, env: dict[str, str]):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.env = {
+            **os.environ,
+            **env,
+            "REGISTRY_URL": registry_url,
+            "MODEL_NAME": MODEL_NAME,
+            "MODEL_VERSION": MODEL_VERSION,
+            "MODEL_CACHE_PATH": str(cache_dir),
+        }
+        self.process: subprocess.Popen | None = None
+
+    def __enter__(self) -> "Service":
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "app.main:app",
+                "--host",
+                "127.0.0.1",
+                "--port",
+                str(self.port),
+                "--log-level",
+                "warning",
+            ],
+            env=self.env,
+        )
+        return self
+
+    def wait_ready(self, timeout: float = 300) -> float:
+        start = time.perf_counter()
+        while time.perf_counter() - start < timeout:
+            if self.process.poll() is not None:
+                raise RuntimeError("Service exited during startup")
+            try:
+                if requests.get(f"{self.url}/readyz", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise TimeoutError("Service did not become ready")
+
+    def __exit__(self, *exc) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+async def run_client(
+    url: str,
+    audio: list[np.ndarray],
+    speed: float,
+    drain_s: float,
+    delay_s: float,
+    stats: dict,
+) -> None:
+    await asyncio.sleep(delay_s)
+
+    # (samples sent so far, send time) per frame, to find when the audio
+    # holding an utterance's end left the client.
+    sent_samples: list[int] = []
+    sent_at: list[float] = []
+
+    async with websockets.connect(url, max_size=None) as ws:
+
+        async def receive():
+            async for message in ws:
+                received = time.perf_counter()
+                body = json.loads(message)
+                if body.get("type") != "inference":
+                    continue
+
+                end_sample = int(body["end"] * SAMPLE_RATE)
+                i = min(bisect.bisect_left(sent_samples, end_sample), len(sent_at) - 1)
+                stats["latencies"].append(received - sent_at[i])
+                stats["utterances"] += 1
+
+        receiver = asyncio.create_task(receive())
+
+        start = time.perf_counter()
+        total = 0
+        for wav in audio:
+            for offset in range(0, len(wav), FRAME_SAMPLES):
+                frame = wav[offset : offset + FRAME_SAMPLES]
+                await ws.send(frame.tobytes())
+                total += len(frame)
+                sent_samples.append(total)
+                sent_at.append(time.perf_counter())
+
+                if speed > 0:
+                    target = start + total / SAMPLE_RATE / speed
+                    await asyncio.sleep(max(0.0, target - time.perf_counter()))
+
+        stats["audio_s"] += total / SAMPLE_RATE
+
+        # Let the last utterances come back before hanging up.
+        await asyncio.sleep(drain_s)
+        receiver.cancel()
+
+
+async def run_clients(url: str, audio: list[np.ndarray], args) -> dict:
+    stats = {"latencies": [], "utterances": 0, "audio_s": 0.0, "errors": 0}
+
+    async def client(i: int):
+        # Each client starts at a different file so they don't move in lockstep.
+        order = audio[i % len(audio) :] + audio[: i % len(audio)]
+        delay = args.ramp * i / max(args.clients, 1)
+        try:
+            await run_client(url, order, args.speed, args.drain, delay, stats)
+        except Exception as e:
+            print(f"client {i}: {e}")
+            stats["errors"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(args.clients)))
+    stats["wall_s"] = time.perf_counter() - start
+    return stats
+
+
+def summarize(stats: dict) -> dict:
+    latencies = np.array(stats["latencies"] or [np.nan]) * 1000
+    wall = stats["wall_s"]
+    return {
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "latency_ms_p99": float(np.percentile(latencies, 99)),
+        "latency_ms_mean": float(latencies.mean()),
+        "latency_ms_max": float(latencies.max()),
+        "utterances": stats["utterances"],
+        "errors": stats["errors"],
+        "utterances_per_s": stats["utterances"] / wall,
+        "audio_s_per_s": stats["audio_s"] / wall,
+        "wall_s": wall,
+    }
+
+
+# Lower is better for every compared metric except throughput.
+COMPARED = {
+    "latency_ms_p50": False,
+    "latency_ms_p95": False,
+    "latency_ms_p99": False,
+    "utterances_per_s": True,
+    "cpu_percent_mean": False,
+    "rss_mb_peak": False,
+}
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    if baseline["config"] != current["config"]:
+        print("Warning: baseline was run with a different configuration")
+
+    regressions = []
+    print(f"{'metric':>18} {'baseline':>10} {'current':>10} {'change':>8}")
+    for metric, higher_is_better in COMPARED.items():
+        old = baseline["results"][metric]
+        new = current["results"][metric]
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{metric:>18} {old:>10.1f} {new:>10.1f} {change:>+8.1%}{flag}")
+        if flag:
+            regressions.append(metric)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wav", nargs="+", required=True, help="speech WAV files")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="1 = real time, 0 = unpaced"
+    )
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds")
+    parser.add_argument("--drain", type=float, default=3.0, help="seconds")
+    parser.add_argument(
+        "--model-dir",
+        type=Path,
+        default=None,
+        help="model.onnx + preprocessor_config.json; a tiny WavLM by default",
+    )
+    parser.add_argument(
+        "--env",
+        nargs="*",
+        default=[],
+        metavar="KEY=VALUE",
+        help="service settings, e.g. INFER_MAX_BATCH_SIZE=16",
+    )
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--compare", default=None, help="baseline results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    audio = [load_wav(path) for path in args.wav]
+    env = dict(kv.split("=", 1) for kv in args.env)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        model_dir = args.model_dir or build_tiny_wavlm(tmp / "tiny-wavlm")
+        manifest = build_manifest(model_dir, MODEL_NAME, MODEL_VERSION)
+
+        with StandInRegistry([manifest]) as registry, Service(
+            registry.url, tmp / "cache", env
+        ) as service:
+            startup_s = service.wait_ready()
+            ws_url = f"ws://127.0.0.1:{service.port}/v1/ws"
+
+            with ProcessSampler(service.process.pid) as sampler:
+                stats = asyncio.run(run_clients(ws_url, audio, args))
+
+    report = {
+        "config": {
+            "clients": args.clients,
+            "speed": args.speed,
+            "files": [os.path.basename(p) for p in args.wav],
+            "model": str(args.model_dir) if args.model_dir else "tiny-wavlm",
+            "env": env,
+        },
+        "results": {
+            **summarize(stats),
+            **sampler.summary(),
+            "startup_s": startup_s,
+        },
+    }
+
+    print(json.dumps(report["results"], indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(baseline, report, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ type Manifest struct {
 	Audio  *AudioSpec     `json:"audio,omitempty"`
 	Labels map[string]int `json:"labels,omitempty"`
 
+	Runtime map[string]any `json:"runtime,omitempty"`
+
 	Artifacts map[string]Artifact `json:"artifacts"`
 }
 